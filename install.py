@@ -3,14 +3,25 @@
 Claude Code 插件自动管理器 - 跨平台安装脚本
 支持 macOS、Linux、Windows、DevContainer
 """
-import importlib.util
+import functools
+import hashlib
 import json
 import os
 import platform
 import shutil
+import stat
 import sys
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Dict
+
+
+# 当前操作系统（运行期间不变，只查询一次）
+_SYSTEM = platform.system()
+
+# 配置备份文件名中的时间戳格式
+BACKUP_TIMESTAMP_FORMAT = "%Y%m%d-%H%M%S"
+PLUGIN_VERSION = "1.0.0"
 
 
 def log_info(message: str) -> None:
@@ -28,11 +39,24 @@ def log_error(message: str) -> None:
     print(f"✗ {message}", file=sys.stderr)
 
 
-def get_claude_dir() -> Path:
-    """获取 Claude 配置目录（跨平台）"""
-    system = platform.system()
+def _load_json(path: Path) -> Any:
+    """读取 JSON 文件（直接解析 UTF-8 字节，省去中间 str 解码）"""
+    return json.loads(path.read_bytes())
+
+
+# json.dumps 传入非默认参数时每次都会新建 JSONEncoder，这里复用同一个实例
+_JSON_ENCODER = json.JSONEncoder(indent=2, ensure_ascii=False, separators=(",", ": "))
 
-    if system == "Windows":
+
+def _dump_json(data: Any) -> bytes:
+    """序列化为带缩进、保留非 ASCII 字符的 UTF-8 JSON 字节（末尾换行）"""
+    return _JSON_ENCODER.encode(data).encode("utf-8") + b"\n"
+
+
+@functools.lru_cache(maxsize=1)
+def get_claude_dir() -> Path:
+    """获取 Claude 配置目录（跨平台，单次运行内结果不变，缓存）"""
+    if _SYSTEM == "Windows":
         # Windows: %APPDATA%\Claude
         appdata = os.getenv("APPDATA")
         if appdata:
@@ -69,110 +93,150 @@ def check_dependencies() -> bool:
     return True
 
 
-def backup_config(file_path: Path) -> None:
-    """备份配置文件"""
-    if file_path.exists():
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
-        backup_path = file_path.with_suffix(f".backup.{timestamp}")
-        shutil.copy2(file_path, backup_path)
-        log_info(f"已备份: {backup_path.name}")
-
+@functools.lru_cache(maxsize=1)
+def _backup_timestamp() -> str:
+    """本次安装运行的备份时间戳（同一次运行内的所有备份共用）"""
+    return datetime.now(timezone.utc).strftime(BACKUP_TIMESTAMP_FORMAT)
 
-def update_settings_json(plugin_dir: Path) -> bool:
-    """更新 settings.json"""
-    claude_dir = get_claude_dir()
-    settings_file = claude_dir / "settings.json"
 
-    if not settings_file.exists():
-        log_error("settings.json 不存在")
-        return False
+def backup_config(file_path: Path) -> None:
+    """备份配置文件
 
+    优先使用硬链接（O(1)，不复制数据）：配置文件随后通过 os.replace
+    整体替换，备份仍指向旧 inode，内容不受影响。跨设备或文件系统不支持
+    硬链接时回退到 shutil.copy2。
+    """
+    backup_path = file_path.with_suffix(f".backup.{_backup_timestamp()}")
     try:
-        # 备份
-        backup_config(settings_file)
-
-        # 读取
-        settings = json.loads(settings_file.read_text(encoding="utf-8"))
+        os.link(file_path, backup_path)
+    except FileNotFoundError:
+        return  # 原文件不存在，无需备份
+    except OSError:
+        shutil.copy2(file_path, backup_path)
+    log_info(f"已备份: {backup_path.name}")
 
-        # 确保 enabledPlugins 存在
-        if "enabledPlugins" not in settings:
-            settings["enabledPlugins"] = {}
 
-        # 检查是否已安装
-        if "auto-manager" in settings["enabledPlugins"]:
-            log_warn("插件已在 settings.json 中")
-            response = input("是否重新安装？(y/N) ")
-            if response.lower() != "y":
-                return True
+def _safe_write_json(path: Path, data: Any, backup: bool = False) -> bool:
+    """崩溃安全地写入 JSON 文件，内容未变化时跳过写入
 
-        # 添加插件
-        settings["enabledPlugins"]["auto-manager"] = True
+    流程：序列化 → 与现有文件比较 SHA-256（相同则直接返回）→ 按需备份 →
+    O_EXCL 创建临时文件写入并 fsync → 回读校验 SHA-256 → os.replace 原子替换。
+    path 为符号链接时替换其指向的文件，并保留原文件的权限位。
 
-        # 保存
-        settings_file.write_text(
-            json.dumps(settings, indent=2, ensure_ascii=False) + "\n", encoding="utf-8"
-        )
+    Args:
+        path: 目标文件路径
+        data: 待写入的 JSON 数据
+        backup: 内容变化时是否先备份原文件
 
-        log_info("已更新 settings.json")
-        return True
-    except Exception as e:
-        log_error(f"更新 settings.json 失败: {e}")
-        return False
+    Returns:
+        True 表示已写入，False 表示内容未变化而跳过
+    """
+    payload = _dump_json(data)
+    digest = hashlib.sha256(payload).digest()
 
+    try:
+        if hashlib.sha256(path.read_bytes()).digest() == digest:
+            return False
+    except FileNotFoundError:
+        pass
+
+    if backup:
+        backup_config(path)
+
+    # 解析符号链接：替换链接指向的真实文件，而不是把链接本身替换为普通文件
+    target = os.path.realpath(path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # 临时文件名包含进程 ID，多个安装程序同时运行时互不覆盖
+    temp_file = f"{target}.{os.getpid()}.tmp"
+    try:
+        os.unlink(temp_file)  # 清理同一进程 ID 上次中断残留的临时文件
+    except FileNotFoundError:
+        pass
+    try:
+        mode = stat.S_IMODE(os.stat(target).st_mode)
+    except FileNotFoundError:
+        mode = None
+    fd = os.open(temp_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if mode is not None:
+                os.chmod(temp_file, mode)  # 保留原文件权限
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+        with open(temp_file, "rb") as f:
+            if hashlib.sha256(f.read()).digest() != digest:
+                raise OSError(f"临时文件校验失败: {temp_file}")
+
+        os.replace(temp_file, target)
+    except Exception:
+        try:
+            os.unlink(temp_file)
+        except FileNotFoundError:
+            pass
+        raise
+    return True
 
-def update_installed_plugins(plugin_dir: Path) -> bool:
-    """更新 installed_plugins.json"""
-    claude_dir = get_claude_dir()
-    installed_file = claude_dir / "plugins" / "installed_plugins.json"
 
-    if not installed_file.exists():
-        log_error("installed_plugins.json 不存在")
-        return False
+def enable_plugin_in_settings(settings: Dict[str, Any]) -> None:
+    """在 settings.json 数据中启用 auto-manager（仅修改内存中的数据）"""
+    enabled_plugins = settings.setdefault("enabledPlugins", {})
 
-    try:
-        # 备份
-        backup_config(installed_file)
+    # 检查是否已安装
+    if "auto-manager" in enabled_plugins:
+        log_warn("插件已在 settings.json 中")
+        response = input("是否重新安装？(y/N) ")
+        if response.lower() != "y":
+            return
 
-        # 读取
-        installed = json.loads(installed_file.read_text(encoding="utf-8"))
+    # 添加插件
+    enabled_plugins["auto-manager"] = True
 
-        # 确保 plugins 存在
-        if "plugins" not in installed:
-            installed["plugins"] = {}
 
-        # 添加插件记录
-        installed["plugins"]["auto-manager"] = [
-            {
-                "scope": "user",
-                "installPath": str(plugin_dir),
-                "version": "1.0.0",
-                "installedAt": datetime.now(timezone.utc).isoformat(),
-                "lastUpdated": datetime.now(timezone.utc).isoformat(),
-            }
-        ]
+def register_plugin_in_installed(installed: Dict[str, Any], plugin_dir: Path) -> None:
+    """在 installed_plugins.json 数据中登记 auto-manager（仅修改内存中的数据）"""
+    plugins = installed.setdefault("plugins", {})
 
-        # 保存
-        installed_file.write_text(
-            json.dumps(installed, indent=2, ensure_ascii=False) + "\n",
-            encoding="utf-8",
-        )
+    # 已登记在同一路径、同一版本时保持记录不变，避免无意义的备份和写入
+    existing = plugins.get("auto-manager")
+    if (
+        isinstance(existing, list)
+        and existing
+        and isinstance(existing[0], dict)
+        and existing[0].get("installPath") == str(plugin_dir)
+        and existing[0].get("version") == PLUGIN_VERSION
+    ):
+        return
 
-        log_info("已更新 installed_plugins.json")
-        return True
-    except Exception as e:
-        log_error(f"更新 installed_plugins.json 失败: {e}")
-        return False
+    # 添加插件记录（installedAt 与 lastUpdated 共用同一时间戳）
+    now_iso = datetime.now(timezone.utc).isoformat()
+    plugins["auto-manager"] = [
+        {
+            "scope": "user",
+            "installPath": str(plugin_dir),
+            "version": PLUGIN_VERSION,
+            "installedAt": now_iso,
+            "lastUpdated": now_iso,
+        }
+    ]
 
 
 def set_permissions(plugin_dir: Path) -> None:
     """设置脚本执行权限（Unix 系统）"""
-    if platform.system() != "Windows":
+    if _SYSTEM != "Windows":
         log_info("设置脚本执行权限...")
         scripts_dir = plugin_dir / "scripts"
         # 0o744：所有者可读写执行，组和其他用户只读
-        for pattern in ("*.sh", "*.py"):
-            for script in scripts_dir.glob(pattern):
-                script.chmod(0o744)
+        # 单次 scandir 遍历收集目标文件，关闭目录句柄后再逐个 chmod
+        with os.scandir(scripts_dir) as it:
+            targets = [
+                entry.path
+                for entry in it
+                if entry.is_file() and entry.name.endswith((".sh", ".py"))
+            ]
+        for path in targets:
+            os.chmod(path, 0o744)
 
 
 def _build_hook_entry(command: str) -> dict:
@@ -190,62 +254,100 @@ def _build_hook_entry(command: str) -> dict:
     }
 
 
-def setup_global_hook(plugin_dir: Path) -> bool:
-    """在 ~/.claude/settings.local.json 中设置全局 SessionStart Hook"""
+def add_global_hook(data: Dict[str, Any], script_path: str) -> None:
+    """在 settings.local.json 数据中设置全局 SessionStart Hook（仅修改内存中的数据）"""
+    session_start_hooks = data.get("hooks", {}).get("SessionStart", [])
+
+    # 单次遍历建立 command → (分组索引, Hook 索引) 索引，保留首次出现的位置
+    hook_index = {}
+    for i, hook_group in enumerate(session_start_hooks):
+        for j, hook in enumerate(hook_group.get("hooks", ())):
+            hook_index.setdefault(hook.get("command"), (i, j))
+
+    existing = hook_index.get(script_path)
+    if existing is None:
+        data.setdefault("hooks", {}).setdefault("SessionStart", []).append(
+            _build_hook_entry(script_path)
+        )
+        return
+
+    hook_group = session_start_hooks[existing[0]]
+    hook_entry = hook_group["hooks"][existing[1]]
+    if "matcher" in hook_group and hook_entry.get("async") is True:
+        log_info("全局 Hook 已配置")
+        return
+
+    hook_group.setdefault("matcher", "startup")
+    hook_entry["async"] = True
+    log_info("升级全局 Hook 配置（添加 matcher/async）")
+
+
+def apply_config_changes(plugin_dir: Path) -> bool:
+    """一次性完成所有 Claude 配置文件的修改
+
+    先读取 settings.json、installed_plugins.json、settings.local.json，
+    在内存中完成全部修改后再逐个写回；内容未变化的文件既不备份也不写入。
+    两个必需文件任一缺失或无法解析时不做任何写入。
+
+    全局 Hook 不依赖 installed_plugins.json，作为 DevContainer 和 fallback；
+    settings.local.json 出错只记录错误，不影响安装结果。
+
+    Returns:
+        True 表示 settings.json 与 installed_plugins.json 均已处理成功
+    """
     claude_dir = get_claude_dir()
+    settings_file = claude_dir / "settings.json"
+    installed_file = claude_dir / "plugins" / "installed_plugins.json"
     settings_local = claude_dir / "settings.local.json"
-    script_path = str(plugin_dir / "scripts" / "session-start.sh")
 
+    # 1. 读取（直接打开文件，以 FileNotFoundError 判断缺失，省去额外的 stat）
     try:
-        data = json.loads(settings_local.read_text(encoding="utf-8")) if settings_local.exists() else {}
-
-        session_start_hooks = data.get("hooks", {}).get("SessionStart", [])
-        existing_idx = None
-        existing_hook_idx = None
-        needs_upgrade = False
-        for i, hook_group in enumerate(session_start_hooks):
-            for j, hook in enumerate(hook_group.get("hooks", [])):
-                if hook.get("command") == script_path:
-                    existing_idx = i
-                    existing_hook_idx = j
-                    has_matcher = "matcher" in hook_group
-                    has_async = hook.get("async") is True
-                    needs_upgrade = not has_matcher or not has_async
-                    break
-            if existing_idx is not None:
-                break
-
-        if existing_idx is not None and not needs_upgrade:
-            log_info("全局 Hook 已配置")
-            return True
-
-        if existing_idx is not None:
-            hook_group = session_start_hooks[existing_idx]
-            if "matcher" not in hook_group:
-                hook_group["matcher"] = "startup"
-
-            hook_entry = hook_group.get("hooks", [])[existing_hook_idx]
-            if hook_entry.get("async") is not True:
-                hook_entry["async"] = True
-            log_info("升级全局 Hook 配置（添加 matcher/async）")
-        else:
-            data.setdefault("hooks", {}).setdefault("SessionStart", []).append(
-                _build_hook_entry(script_path)
-            )
-
-        # 原子写入
-        settings_local.parent.mkdir(parents=True, exist_ok=True)
-        temp_file = settings_local.with_suffix(".json.tmp")
-        temp_file.write_text(
-            json.dumps(data, indent=2, ensure_ascii=False) + "\n", encoding="utf-8"
-        )
-        temp_file.rename(settings_local)
-        log_info(f"已配置全局 Hook: {settings_local}")
-        return True
+        settings = _load_json(settings_file)
+        installed = _load_json(installed_file)
+    except FileNotFoundError as e:
+        log_error(f"{Path(e.filename).name} 不存在")
+        return False
     except Exception as e:
-        log_error(f"配置全局 Hook 失败: {e}")
+        log_error(f"读取配置文件失败: {e}")
         return False
 
+    try:
+        local_settings = _load_json(settings_local)
+    except FileNotFoundError:
+        local_settings = {}
+    except Exception as e:
+        log_error(f"配置全局 Hook 失败: {e}")
+        local_settings = None
+
+    # 2. 在内存中修改
+    enable_plugin_in_settings(settings)
+    register_plugin_in_installed(installed, plugin_dir)
+    if local_settings is not None:
+        add_global_hook(local_settings, str(plugin_dir / "scripts" / "session-start.sh"))
+
+    # 3. 写回（内容变化时才备份并写入）
+    for name, path, data in (
+        ("settings.json", settings_file, settings),
+        ("installed_plugins.json", installed_file, installed),
+    ):
+        try:
+            if _safe_write_json(path, data, backup=True):
+                log_info(f"已更新 {name}")
+            else:
+                log_info(f"{name} 无变化")
+        except Exception as e:
+            log_error(f"更新 {name} 失败: {e}")
+            return False
+
+    if local_settings is not None:
+        try:
+            if _safe_write_json(settings_local, local_settings):
+                log_info(f"已配置全局 Hook: {settings_local}")
+        except Exception as e:
+            log_error(f"配置全局 Hook 失败: {e}")
+
+    return True
+
 
 def install_startup_service(plugin_dir: Path) -> None:
     """安装 OS 级启动服务（macOS LaunchAgent / Linux systemd / cron）
@@ -258,7 +360,15 @@ def install_startup_service(plugin_dir: Path) -> None:
         log_warn("startup-service.py 未找到，跳过 OS 服务安装")
         return
 
+    # Windows 无需加载 startup-service 模块即可判定跳过
+    if _SYSTEM == "Windows":
+        log_warn("Windows 暂不支持 OS 启动服务，保持现有 Claude Code Hook 机制")
+        return
+
     try:
+        # 延迟导入：仅在确实需要加载 startup-service.py 时才引入
+        import importlib.util
+
         spec = importlib.util.spec_from_file_location("startup_service", str(startup_script))
         startup_module = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(startup_module)
@@ -267,9 +377,6 @@ def install_startup_service(plugin_dir: Path) -> None:
         if plat == "devcontainer":
             log_warn("DevContainer 环境，跳过 OS 服务安装（使用 Claude Code Hook）")
             return
-        if plat == "windows":
-            log_warn("Windows 暂不支持 OS 启动服务，保持现有 Claude Code Hook 机制")
-            return
 
         result = startup_module.install_service(plugin_dir)
         if result:
@@ -284,23 +391,25 @@ def check_snapshot(plugin_dir: Path) -> None:
     """检查快照文件"""
     snapshot_file = plugin_dir / "snapshots" / "current.json"
 
-    if snapshot_file.exists():
-        try:
-            snapshot = json.loads(snapshot_file.read_text(encoding="utf-8"))
-            plugin_count = len(snapshot.get("plugins", {}))
-            log_info(f"发现快照文件，包含 {plugin_count} 个插件")
-            log_warn("下次启动 Claude Code 时，将自动安装快照中的插件")
-        except Exception as e:
-            log_warn(f"无法读取快照文件: {e}")
-    else:
+    try:
+        snapshot = _load_json(snapshot_file)
+    except FileNotFoundError:
         log_warn("未找到快照文件，将在首次运行时生成")
+        return
+    except Exception as e:
+        log_warn(f"无法读取快照文件: {e}")
+        return
+
+    plugin_count = len(snapshot.get("plugins", {}))
+    log_info(f"发现快照文件，包含 {plugin_count} 个插件")
+    log_warn("下次启动 Claude Code 时，将自动安装快照中的插件")
 
 
 def main() -> int:
     """主函数"""
     print("=" * 50)
     print("Claude Plugin Auto-Manager 安装脚本")
-    print(f"平台: {platform.system()} {platform.release()}")
+    print(f"平台: {_SYSTEM} {platform.release()}")
     print("=" * 50)
     print()
 
@@ -315,17 +424,10 @@ def main() -> int:
     # 2. 设置脚本权限
     set_permissions(plugin_dir)
 
-    # 3. 更新 settings.json
-    if not update_settings_json(plugin_dir):
+    # 3-5. 更新 settings.json、installed_plugins.json 并设置全局 Hook（一次性完成）
+    if not apply_config_changes(plugin_dir):
         return 1
 
-    # 4. 更新 installed_plugins.json
-    if not update_installed_plugins(plugin_dir):
-        return 1
-
-    # 5. 设置全局 Hook（不依赖 installed_plugins.json，作为 DevContainer 和 fallback）
-    setup_global_hook(plugin_dir)
-
     # 5.5. 安装 OS 级启动服务（主要机制，不依赖 Claude Code Hook）
     install_startup_service(plugin_dir)
 
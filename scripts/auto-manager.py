@@ -5,16 +5,20 @@ Claude Code 插件自动管理器
 - 每 24 小时自动更新所有插件
 - 发送 macOS 系统通知
 """
-import argparse
-import importlib.util
+import filecmp
+import functools
+import hashlib
 import json
 import os
 import re
+import shutil
 import subprocess
 import sys
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Set, Tuple
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TypeVar, Union
 
 
 # 配置路径
@@ -26,6 +30,9 @@ CONFIG_FILE = AUTO_MANAGER_DIR / "config.json"
 CURRENT_SNAPSHOT = SNAPSHOT_DIR / "current.json"
 LAST_UPDATE_FILE = SNAPSHOT_DIR / ".last-update"
 LAST_INSTALL_STATE = SNAPSHOT_DIR / ".last-install-state.json"
+LAST_INSTALL_CHECK = SNAPSHOT_DIR / ".last-install-check"
+SNAPSHOT_KEYS_HASH = SNAPSHOT_DIR / ".snapshot-keys-hash"
+SKILLS_SYNC_CACHE = SNAPSHOT_DIR / ".skills-sync-cache"
 GLOBAL_RULES_SOURCE = AUTO_MANAGER_DIR / "global-rules" / "CLAUDE.md"
 GLOBAL_RULES_TARGET = CLAUDE_DIR / "CLAUDE.md"
 GLOBAL_SKILLS_SOURCE_DIR = AUTO_MANAGER_DIR / "global-skills"
@@ -37,60 +44,250 @@ STARTUP_SERVICE_SCRIPT = AUTO_MANAGER_DIR / "scripts" / "startup-service.py"
 
 # 常量配置
 # 日志管理
-MAX_LOG_SIZE_MB = 10
-KEEP_LOG_SIZE_MB = 8
+MAX_LOG_SIZE_MB = 10  # 超过后轮转为 auto-manager.log.1
 
 # 重试机制
 RETRY_INTERVAL_SECONDS = 600  # 10 分钟
 MAX_RETRY_COUNT = 5
 
 # 超时时间（秒）
-COMMAND_TIMEOUT_SHORT = 60   # Git 操作、快照创建
+COMMAND_TIMEOUT_SHORT = 60   # Git 操作、Git 同步总时长
+GIT_LS_REMOTE_TIMEOUT = 5    # git pull 前的远程 HEAD 检查，超时则直接 pull
 COMMAND_TIMEOUT_LONG = 120   # 插件安装/更新
 HOOK_TIMEOUT = 120           # SessionStart Hook 超时
 
+# 并发执行 claude CLI（安装/更新插件、更新 marketplace）的最大线程数
+MAX_PARALLEL_WORKERS = 4
+
 # 双重运行防护：5 分钟内运行过则跳过（防 OS 服务 + Claude Code Hook 同时触发）
 RECENT_RUN_THRESHOLD_SECONDS = 300
 
 
-def log(message: str) -> None:
-    """输出日志消息，并在日志文件超过限制时自动轮转"""
-    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-    print(f"[{timestamp}] {message}", flush=True)
+# 串行化日志输出，避免并发任务的日志行交错
+_LOG_LOCK = threading.Lock()
+
+# _run_parallel() 的工作线程在此暂存本任务的日志行，任务完成后按输入顺序整体输出
+_task_log = threading.local()
+
+
+_LOG_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
 
-    # 日志轮转（错误不影响主流程）
+
+def _log_timestamp() -> str:
+    """返回日志时间戳（UTC）
+
+    time.gmtime() + time.strftime 直接格式化 struct_time，无需构造带时区的 datetime 对象。
+    """
+    return time.strftime(_LOG_TIME_FORMAT, time.gmtime())
+
+
+def log(message: str, flush: bool = False) -> None:
+    """输出日志消息（线程安全）
+
+    日志轮转由 main() 启动时调用一次 _maybe_rotate_log() 完成，
+    这里不再逐行检查日志文件大小。
+
+    默认不逐行 flush，由 stdout 缓冲区合并写入。所有启动方式都把 stdout 重定向到日志文件（块缓冲），
+    进程被 Hook/服务超时强制结束时缓冲内容会丢失，因此开始/结束横幅等关键行传入 flush=True
+    立即刷出（连同之前缓冲的行），也避免与无缓冲的 stderr 在日志文件中乱序。
+    整行（含换行符）一次 write 写入缓冲区，print() 会把内容和换行符分两次写入。
+    """
+    timestamp = _log_timestamp()
+    line = f"[{timestamp}] {message}"
+    buffered = getattr(_task_log, "lines", None)
+    if buffered is not None:
+        buffered.append(line)
+        return
+    with _LOG_LOCK:
+        sys.stdout.write(line + "\n")
+        if flush:
+            sys.stdout.flush()
+
+
+def _emit_log_lines(lines: List[str]) -> None:
+    """一次性输出一组已带时间戳的日志行并立即刷出
+
+    每组对应并发阶段中一个已完成的任务，逐组刷出，进程在长时间的安装/更新阶段被强制结束时
+    已完成任务的日志不会丢失。
+    """
+    if lines:
+        with _LOG_LOCK:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+
+
+def _maybe_rotate_log() -> None:
+    """日志文件超过限制时轮转（每个进程启动时检查一次）"""
     try:
         max_size = MAX_LOG_SIZE_MB * 1024 * 1024
         log_file = LOG_DIR / "auto-manager.log"
 
-        if log_file.exists() and log_file.stat().st_size > max_size:
-            keep_size = KEEP_LOG_SIZE_MB * 1024 * 1024
-            file_size = log_file.stat().st_size
-            seek_offset = max(-file_size, -keep_size)
-
-            with open(log_file, "rb") as f:
-                f.seek(seek_offset, 2)  # 从文件末尾往前
-                content = f.read()
-
-            # 找到第一个完整行的开始位置
-            first_newline = content.find(b"\n")
-            if first_newline != -1:
-                content = content[first_newline + 1:]
-
-            # 写回截断后的内容（使用临时文件避免损坏）
-            temp_log = log_file.with_suffix(".log.tmp")
-            with open(temp_log, "wb") as f:
-                f.write(f"[{timestamp}] [LOG ROTATED - keeping last {KEEP_LOG_SIZE_MB}MB]\n".encode())
-                f.write(content)
-            temp_log.rename(log_file)
+        try:
+            size = os.stat(log_file).st_size
+        except FileNotFoundError:
+            return
+
+        if size > max_size:
+            # 重命名为 .log.1（只保留一份备份，已存在则覆盖），仅是元数据操作，
+            # 无需读写日志内容。本进程的 stdout 仍指向旧 inode，
+            # 启动器下次以追加模式重定向时会自动创建新的日志文件
+            os.replace(log_file, LOG_DIR / "auto-manager.log.1")
     except Exception as e:
         # 日志轮转失败不影响主流程，输出到 stderr
+        timestamp = _log_timestamp()
         print(f"[{timestamp}] Warning: Log rotation failed: {e}", file=sys.stderr, flush=True)
 
 
+_T = TypeVar("_T")
+
+
+def _run_parallel(func: Callable[[str], _T], items: List[str]) -> List[_T]:
+    """用有界线程池并发执行 func(item)，按输入顺序返回结果
+
+    每个任务都阻塞在 I/O 上（claude CLI 子进程或文件读写），线程即可并行；
+    共享状态的修改由调用方在收集结果后于主线程统一完成。
+    各任务的日志先在工作线程内暂存，按输入顺序逐个任务整体输出，不同任务的日志不会交错。
+    """
+    if len(items) <= 1:
+        return [func(item) for item in items]
+
+    # 延迟导入：concurrent.futures 会连带加载 logging，只在确实需要并发时才付出代价
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run(item: str) -> Tuple[_T, List[str]]:
+        lines: List[str] = []
+        _task_log.lines = lines
+        try:
+            return func(item), lines
+        except BaseException:
+            _emit_log_lines(lines)
+            raise
+        finally:
+            _task_log.lines = None
+
+    results: List[_T] = []
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_WORKERS, len(items))) as executor:
+        for result, lines in executor.map(run, items):
+            _emit_log_lines(lines)
+            results.append(result)
+    return results
+
+
+@functools.lru_cache(maxsize=32)
+def _load_json_file(path: str, mtime_ns: int, size: int) -> Any:
+    """解析 JSON 文件（mtime_ns/size 仅作为缓存键，文件变化后自动失效）"""
+    with open(path, "rb") as f:
+        return json.loads(f.read())
+
+
+# 本进程刚写入的 JSON 数据：路径 -> (mtime_ns, 大小, 数据)，避免写入后立即重新解析
+_json_primed: Dict[str, Tuple[int, int, Any]] = {}
+
+
+def _read_json_cached(path: Path) -> Any:
+    """读取 JSON 文件，同一进程内按 (路径, mtime, 大小) 缓存解析结果
+
+    返回的对象在调用方之间共享，只能读取不能修改。
+    文件不存在时抛出 FileNotFoundError。
+    """
+    st = os.stat(path)
+    key = str(path)
+    primed = _json_primed.get(key)
+    if primed is not None and primed[0] == st.st_mtime_ns and primed[1] == st.st_size:
+        return primed[2]
+    return _load_json_file(key, st.st_mtime_ns, st.st_size)
+
+
+def _fsync_directory(path: str) -> None:
+    """将目录项刷到磁盘，确保 rename 在崩溃后仍然生效
+
+    仅 POSIX 支持以 O_DIRECTORY 打开目录；文件内容已替换成功，目录 fsync 失败时忽略。
+    """
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    try:
+        fd = os.open(path or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _invalidate_json_cache(path: Optional[Path] = None) -> None:
+    """使 JSON 读取缓存失效，防止 mtime 精度不足时读到旧内容
+
+    解析缓存与 marketplace 名称校验缓存整体清空；预填充数据只移除 path 对应的条目，
+    path 为 None 时全部移除。
+    """
+    _load_json_file.cache_clear()
+    _validated_marketplaces.cache_clear()
+    if path is None:
+        _json_primed.clear()
+    else:
+        _json_primed.pop(str(path), None)
+
+
+def _replace_file(path: Union[str, Path], payload: bytes, *, fsync: bool = False) -> None:
+    """原子替换文件内容（临时文件 + os.replace）
+
+    临时文件名包含进程 ID 并以 O_EXCL 创建，OS 服务与 Hook 同时运行时互不覆盖；
+    os.replace 在目标已存在时也能原子覆盖（Windows 上 Path.rename 会失败）。
+    失败时删除临时文件后重新抛出异常。
+    fsync 为 True 时替换前刷写临时文件、替换后刷写所在目录，崩溃后不会丢失更新。
+    """
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    except Exception:
+        try:
+            os.unlink(temp_file)
+        except FileNotFoundError:
+            pass
+        raise
+    if fsync:
+        _fsync_directory(os.path.dirname(path))
+
+
+def _atomic_write_json(
+    path: Path, data: Any, *, indent: int = 2, fsync: bool = False, prime_cache: bool = False
+) -> None:
+    """原子写入 JSON 文件（见 _replace_file），并使 JSON 缓存失效
+
+    参数:
+        path: 目标文件路径
+        data: 待写入的数据
+        indent: 缩进空格数（与各文件原有格式保持一致）
+        fsync: 是否将临时文件及所在目录刷到磁盘
+        prime_cache: 写入后直接用 data 填充读取缓存（调用方之后不得再修改 data）
+    """
+    payload = (json.dumps(data, indent=indent, ensure_ascii=False) + "\n").encode("utf-8")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        _replace_file(path, payload, fsync=fsync)
+    finally:
+        _invalidate_json_cache(path)
+
+    if prime_cache:
+        st = os.stat(path)
+        _json_primed[str(path)] = (st.st_mtime_ns, st.st_size, data)
+
+
 def load_config() -> Dict[str, Any]:
-    """加载配置文件，不存在时返回默认配置"""
-    if not CONFIG_FILE.exists():
+    """加载配置文件，不存在时返回默认配置
+
+    解析结果按配置文件的 mtime/大小缓存（见 _read_json_cached），同一进程内重复调用不再解析。
+    """
+    try:
+        return _read_json_cached(CONFIG_FILE)
+    except FileNotFoundError:
         # 返回默认配置
         return {
             "auto_install": {"enabled": True},
@@ -101,26 +298,23 @@ def load_config() -> Dict[str, Any]:
             "snapshot": {"keep_versions": 10},
         }
 
-    return json.loads(CONFIG_FILE.read_text())
-
 
 def get_installed_plugins() -> Set[str]:
     """获取当前已安装的插件名称集合（格式：name@marketplace）"""
-    installed_file = CLAUDE_DIR / "plugins" / "installed_plugins.json"
-    if not installed_file.exists():
+    try:
+        data = _read_json_cached(CLAUDE_DIR / "plugins" / "installed_plugins.json")
+    except FileNotFoundError:
         return set()
-
-    data = json.loads(installed_file.read_text())
     return set(data.get("plugins", {}).keys())
 
 
 def get_snapshot_plugins() -> Dict[str, Any]:
     """读取快照中的插件字典"""
-    if not CURRENT_SNAPSHOT.exists():
+    try:
+        snapshot = _read_json_cached(CURRENT_SNAPSHOT)
+    except FileNotFoundError:
         log("No snapshot found, skipping operations")
         return {}
-
-    snapshot = json.loads(CURRENT_SNAPSHOT.read_text())
     return snapshot.get("plugins", {})
 
 
@@ -132,43 +326,80 @@ def load_install_state() -> Dict[str, Any]:
         "plugin-name@marketplace": {
             "status": "installed" | "failed",
             "last_attempt": "ISO8601 timestamp",
+            "last_attempt_ts": 1700000000.0,  # UNIX 时间戳，供重试间隔计算
             "retry_count": 0-5,
             "first_failed_at": "ISO8601 timestamp"  # 仅在失败时存在
         }
     }
+
+    解析结果走 _read_json_cached 共享缓存，检查与安装阶段重复加载时不再解析；
+    返回的每条记录都是副本，调用方可直接修改。
     """
-    if not LAST_INSTALL_STATE.exists():
+    try:
+        state_data = _read_json_cached(LAST_INSTALL_STATE)
+    except FileNotFoundError:
         return {}
 
-    state_data = json.loads(LAST_INSTALL_STATE.read_text())
-
     # 兼容旧格式（简单的 plugins 列表）
     if "plugins" in state_data and isinstance(state_data["plugins"], list):
         # 转换为新格式
-        return {
+        state = {
             plugin: {"status": "installed", "last_attempt": state_data.get("timestamp", ""), "retry_count": 0}
             for plugin in state_data["plugins"]
         }
+    else:
+        state = {
+            plugin: dict(plugin_state) if isinstance(plugin_state, dict) else plugin_state
+            for plugin, plugin_state in state_data.get("plugins", {}).items()
+        }
+
+    # 兼容缺少 last_attempt_ts 的旧记录：加载时解析一次 ISO 时间，下次保存即写回
+    for plugin_state in state.values():
+        if isinstance(plugin_state, dict) and "last_attempt_ts" not in plugin_state:
+            try:
+                last_attempt = datetime.fromisoformat(plugin_state.get("last_attempt", ""))
+            except (ValueError, TypeError):
+                continue
+            # 确保时区感知（兼容旧数据）
+            if last_attempt.tzinfo is None:
+                last_attempt = last_attempt.replace(tzinfo=timezone.utc)
+            plugin_state["last_attempt_ts"] = last_attempt.timestamp()
 
-    # 返回新格式
-    return state_data.get("plugins", {})
+    return state
 
 
-def save_install_state(state: Dict[str, Any]) -> None:
+def save_install_state(state: Dict[str, Any], now: Optional[datetime] = None) -> None:
     """保存安装状态（使用原子写入防止文件损坏）
 
     参数:
         state: 插件状态字典，格式见 load_install_state()
+        now: 本次运行的当前时间（默认取调用时刻），main() 传入同一值保证时间戳一致
     """
+    if now is None:
+        now = datetime.now(timezone.utc)
     state_data = {
         "plugins": state,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": now.isoformat(),
     }
 
-    # 使用临时文件 + rename 实现原子写入（Unix 系统保证原子性）
-    temp_file = LAST_INSTALL_STATE.with_suffix(".json.tmp")
-    temp_file.write_text(json.dumps(state_data, indent=2) + "\n")
-    temp_file.rename(LAST_INSTALL_STATE)
+    # 重试状态丢失会导致重复安装（网络操作），因此刷盘保证持久
+    _atomic_write_json(LAST_INSTALL_STATE, state_data, fsync=True)
+
+
+@functools.lru_cache(maxsize=1)
+def _claude_executable() -> Optional[str]:
+    """解析 claude CLI 的绝对路径（每个进程只查找一次 PATH），找不到时返回 None
+
+    调用 claude CLI 时同时传入 close_fds=False：Python 创建的文件描述符默认不可继承
+    （PEP 446），无需在子进程中逐个关闭；配合绝对路径，subprocess 可走 posix_spawn 快速路径。
+    """
+    return shutil.which("claude")
+
+
+@functools.lru_cache(maxsize=1)
+def _git_executable() -> Optional[str]:
+    """解析 git 的绝对路径（每个进程只查找一次 PATH），找不到时返回 None（由 subprocess 照常报错）"""
+    return shutil.which("git")
 
 
 def install_plugin(plugin_name: str, plugin_info: Dict[str, Any]) -> bool:
@@ -184,7 +415,8 @@ def install_plugin(plugin_name: str, plugin_info: Dict[str, Any]) -> bool:
 
         cmd = ["claude", "plugin", "install", plugin_name]
         result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=COMMAND_TIMEOUT_LONG, check=False
+            cmd, executable=_claude_executable(), close_fds=False, stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE, text=True, timeout=COMMAND_TIMEOUT_LONG, check=False
         )
 
         if result.returncode == 0:
@@ -201,94 +433,147 @@ def install_plugin(plugin_name: str, plugin_info: Dict[str, Any]) -> bool:
         return False
 
 
-def check_missing_plugins() -> Tuple[Set[str], Dict[str, Any]]:
+def _install_check_signature() -> Optional[List[int]]:
+    """返回决定缺失插件检查结果的输入文件签名（快照与 installed_plugins.json 的 mtime/大小）
+
+    任一文件不存在时返回 None。
+    """
+    try:
+        snapshot_stat = os.stat(CURRENT_SNAPSHOT)
+        installed_stat = os.stat(CLAUDE_DIR / "plugins" / "installed_plugins.json")
+    except OSError:
+        return None
+    return [
+        snapshot_stat.st_mtime_ns, snapshot_stat.st_size,
+        installed_stat.st_mtime_ns, installed_stat.st_size,
+    ]
+
+
+def _install_check_is_current(signature: Optional[List[int]]) -> bool:
+    """上次检查确认无缺失插件，且快照与 installed_plugins.json 均未变化"""
+    if signature is None:
+        return False
+    try:
+        return json.loads(LAST_INSTALL_CHECK.read_bytes()).get("signature") == signature
+    except Exception:
+        return False
+
+
+def _mark_install_check(signature: Optional[List[int]]) -> None:
+    """记录本次检查无缺失插件时的输入文件签名（写入失败不影响主流程）"""
+    if signature is None:
+        return
+    try:
+        LAST_INSTALL_CHECK.write_text(json.dumps({"signature": signature}) + "\n")
+    except OSError as e:
+        log(f"Warning: failed to write install check marker: {e}")
+
+
+def check_missing_plugins(now: Optional[datetime] = None) -> Tuple[Set[str], Dict[str, Any]]:
     """检查缺失的插件，返回 (需要安装的插件集合, 快照插件字典)
 
     重试策略: 失败后等待 RETRY_INTERVAL_SECONDS 重试，最多 MAX_RETRY_COUNT 次
+
+    上次检查无缺失插件且快照、installed_plugins.json 均未变化时，
+    直接返回空结果，不再解析两个文件。
+
+    参数:
+        now: 本次运行的当前时间（默认取调用时刻），main() 传入同一值保证时间戳一致
     """
+    signature = _install_check_signature()
+    if _install_check_is_current(signature):
+        return set(), {}
+
     snapshot_plugins = get_snapshot_plugins()
     if not snapshot_plugins:
         return set(), {}
 
     installed = get_installed_plugins()
-    state = load_install_state()
 
-    # 计算缺失的插件（排除本地插件，它们通过 ensure_self_registered() 管理）
-    all_missing = set(snapshot_plugins.keys()) - installed
-    missing = {plugin for plugin in all_missing if "@" in plugin}
-    local_count = len(all_missing) - len(missing)
+    # 集合运算找出缺失插件，跳过本地插件（本地插件通过 ensure_self_registered() 管理）
+    missing = snapshot_plugins.keys() - installed
+    remote_missing = {plugin for plugin in missing if "@" in plugin}
+    local_count = len(missing) - len(remote_missing)
     if local_count > 0:
         log(f"Skipping {local_count} local plugin(s) (no @marketplace suffix)")
 
-    # 过滤需要安装的插件
-    to_install = set()
-    now = datetime.now(timezone.utc)
+    if not remote_missing:
+        # 没有任何缺失的远程插件（无需读取安装状态），记录签名供下次跳过检查
+        _mark_install_check(signature)
+        return set(), snapshot_plugins
+
+    # 仅在确实有缺失插件时才读取安装状态，按状态一次性划分：
+    # 无记录的新插件和“已安装但现在缺失”的插件直接安装，只有失败过的插件需要计算重试间隔
+    state = load_install_state()
+    known = remote_missing & state.keys()
+    reinstall = {plugin for plugin in known if state[plugin].get("status") == "installed"}
+    failed = {plugin for plugin in known - reinstall if state[plugin].get("status") == "failed"}
+    to_install = (remote_missing - known) | reinstall
+
+    now_ts = (now or datetime.now(timezone.utc)).timestamp()
+    for plugin in sorted(failed):
+        plugin_state = state[plugin]
+        retry_count = plugin_state.get("retry_count", 0)
+        if retry_count > MAX_RETRY_COUNT:
+            # 超过最大重试次数，跳过
+            log(f"Skipping {plugin}: exceeded max retries ({MAX_RETRY_COUNT})")
+            continue
+
+        # 检查距离上次尝试是否超过 10 分钟
+        last_attempt_ts = plugin_state.get("last_attempt_ts")
+        if not isinstance(last_attempt_ts, (int, float)):
+            # 时间戳缺失或无效，允许重试
+            to_install.add(plugin)
+            continue
 
-    for plugin in missing:
-        if plugin not in state:
-            # 新的缺失插件，需要安装
+        elapsed = now_ts - last_attempt_ts
+        if elapsed >= RETRY_INTERVAL_SECONDS:
+            log(f"Retrying {plugin}: {elapsed/60:.1f} minutes since last attempt (retry {retry_count + 1}/{MAX_RETRY_COUNT})")
             to_install.add(plugin)
         else:
-            plugin_state = state[plugin]
-            status = plugin_state.get("status")
-            retry_count = plugin_state.get("retry_count", 0)
-
-            if status == "installed":
-                # 已安装但现在缺失，重新安装
-                to_install.add(plugin)
-            elif status == "failed":
-                # 检查是否可以重试
-                if retry_count > MAX_RETRY_COUNT:
-                    # 超过最大重试次数，跳过
-                    log(f"Skipping {plugin}: exceeded max retries ({MAX_RETRY_COUNT})")
-                    continue
-
-                # 检查距离上次尝试是否超过 10 分钟
-                last_attempt_str = plugin_state.get("last_attempt", "")
-                try:
-                    last_attempt = datetime.fromisoformat(last_attempt_str)
-                    # 确保时区感知（兼容旧数据）
-                    if last_attempt.tzinfo is None:
-                        last_attempt = last_attempt.replace(tzinfo=timezone.utc)
-                    elapsed = (now - last_attempt).total_seconds()
-
-                    if elapsed >= RETRY_INTERVAL_SECONDS:
-                        log(f"Retrying {plugin}: {elapsed/60:.1f} minutes since last attempt (retry {retry_count + 1}/{MAX_RETRY_COUNT})")
-                        to_install.add(plugin)
-                    else:
-                        log(f"Skipping {plugin}: only {elapsed/60:.1f} minutes since last attempt (need 10)")
-                except (ValueError, TypeError):
-                    # 时间戳解析失败，允许重试
-                    to_install.add(plugin)
+            log(f"Skipping {plugin}: only {elapsed/60:.1f} minutes since last attempt (need 10)")
 
     return to_install, snapshot_plugins
 
 
-def install_missing_plugins() -> int:
-    """安装缺失的插件并记录重试状态，返回成功安装数量"""
-    to_install, snapshot_plugins = check_missing_plugins()
+def install_missing_plugins(now: Optional[datetime] = None) -> int:
+    """安装缺失的插件并记录重试状态，返回成功安装数量
+
+    参数:
+        now: 本次运行的当前时间（默认取调用时刻），main() 传入同一值保证时间戳一致
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    to_install, snapshot_plugins = check_missing_plugins(now)
 
     if not to_install:
         log("All plugins from snapshot are installed")
         return 0
 
-    log(f"Found {len(to_install)} missing plugins to install")
+    log(f"Found {len(to_install)} missing plugins to install", flush=True)
 
     # 加载当前状态
     state = load_install_state()
     installed_count = 0
-    now = datetime.now(timezone.utc).isoformat()
+    now_iso = now.isoformat()
+    now_ts = now.timestamp()
 
-    for plugin_name in to_install:
-        plugin_info = snapshot_plugins[plugin_name]
-        success = install_plugin(plugin_name, plugin_info)
+    # 并发安装，结果收集完成后再在主线程中更新状态
+    plugin_names = sorted(to_install)
+    results = _run_parallel(
+        lambda name: install_plugin(name, snapshot_plugins[name]), plugin_names
+    )
+    # claude CLI 会改写 installed_plugins.json 等文件，不依赖 mtime 判断，显式丢弃缓存
+    _invalidate_json_cache()
 
+    for plugin_name, success in zip(plugin_names, results):
         if success:
             # 安装成功
             installed_count += 1
             state[plugin_name] = {
                 "status": "installed",
-                "last_attempt": now,
+                "last_attempt": now_iso,
+                "last_attempt_ts": now_ts,
                 "retry_count": 0,
             }
         else:
@@ -296,18 +581,20 @@ def install_missing_plugins() -> int:
             if plugin_name in state and state[plugin_name].get("status") == "failed":
                 # 已经失败过，增加重试计数
                 state[plugin_name]["retry_count"] = state[plugin_name].get("retry_count", 1) + 1
-                state[plugin_name]["last_attempt"] = now
+                state[plugin_name]["last_attempt"] = now_iso
+                state[plugin_name]["last_attempt_ts"] = now_ts
             else:
                 # 首次失败（retry_count=1 表示首次失败）
                 state[plugin_name] = {
                     "status": "failed",
-                    "last_attempt": now,
+                    "last_attempt": now_iso,
+                    "last_attempt_ts": now_ts,
                     "retry_count": 1,
-                    "first_failed_at": now,
+                    "first_failed_at": now_iso,
                 }
 
     # 保存状态
-    save_install_state(state)
+    save_install_state(state, now)
 
     log(f"Auto-install completed: {installed_count}/{len(to_install)} successful")
     return installed_count
@@ -323,17 +610,22 @@ def is_in_claude_session() -> bool:
     return "CLAUDECODE" in os.environ
 
 
-def should_update(config: Dict[str, Any]) -> bool:
-    """根据配置和上次更新时间判断是否需要更新"""
-    if not config["auto_update"]["enabled"]:
-        log("Auto-update is disabled in config")
-        return False
+def should_update(config: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    """根据配置和上次更新时间判断是否需要更新
 
-    # 检测是否在 Claude Code 会话中
+    参数:
+        config: 配置字典
+        now: 本次运行的当前时间（默认取调用时刻），main() 传入同一值保证时间戳一致
+    """
+    # 检测是否在 Claude Code 会话中（只查环境变量，最先判断）
     if is_in_claude_session():
         log("Running inside Claude Code session, skipping plugin update to avoid nested session error")
         return False
 
+    if not config["auto_update"]["enabled"]:
+        log("Auto-update is disabled in config")
+        return False
+
     interval_hours = config["auto_update"]["interval_hours"]
 
     # 如果 interval_hours=0，每次启动都更新
@@ -341,12 +633,12 @@ def should_update(config: Dict[str, Any]) -> bool:
         log("Update interval set to 0, triggering update on every launch")
         return True
 
-    if not LAST_UPDATE_FILE.exists():
+    # 读取上次更新时间
+    try:
+        last_update_str = LAST_UPDATE_FILE.read_text().strip()
+    except FileNotFoundError:
         log("No previous update timestamp, triggering update")
         return True
-
-    # 读取上次更新时间
-    last_update_str = LAST_UPDATE_FILE.read_text().strip()
     try:
         last_update = datetime.fromisoformat(last_update_str)
     except ValueError:
@@ -354,7 +646,8 @@ def should_update(config: Dict[str, Any]) -> bool:
         return True
 
     # 计算时间差
-    now = datetime.now(timezone.utc)
+    if now is None:
+        now = datetime.now(timezone.utc)
     delta = now - last_update
 
     if delta >= timedelta(hours=interval_hours):
@@ -367,9 +660,30 @@ def should_update(config: Dict[str, Any]) -> bool:
     return False
 
 
+# 预先绑定 fullmatch，校验时省去属性查找
+_marketplace_name_fullmatch = re.compile(r"[A-Za-z0-9_-]+").fullmatch
+
+
 def _is_valid_marketplace_name(name: str) -> bool:
     """验证 marketplace 名称格式（仅允许字母、数字、连字符、下划线）"""
-    return bool(re.match(r"^[a-zA-Z0-9_-]+$", name))
+    return _marketplace_name_fullmatch(name) is not None
+
+
+@functools.lru_cache(maxsize=4)
+def _validated_marketplaces(path: str, mtime_ns: int, size: int) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """校验 marketplace 名称，返回 (有效名称, 无效名称)
+
+    mtime_ns/size 仅作为缓存键，文件未变化时直接复用上次的校验结果。
+    """
+    data = _load_json_file(path, mtime_ns, size)
+    names: List[str] = []
+    invalid: List[str] = []
+    for k in data:
+        if _is_valid_marketplace_name(k):
+            names.append(k)
+        else:
+            invalid.append(k)
+    return tuple(names), tuple(invalid)
 
 
 def get_all_marketplaces() -> List[str]:
@@ -379,23 +693,20 @@ def get_all_marketplaces() -> List[str]:
     文件不存在或读取失败时返回空列表。
     名称格式无效的 marketplace 会被跳过。
     """
-    if not KNOWN_MARKETPLACES_FILE.exists():
+    try:
+        st = os.stat(KNOWN_MARKETPLACES_FILE)
+    except FileNotFoundError:
         log(f"Known marketplaces file not found: {KNOWN_MARKETPLACES_FILE}")
         return []
 
     try:
-        data = json.loads(KNOWN_MARKETPLACES_FILE.read_text())
-        names: List[str] = []
-        invalid: List[str] = []
-        for k in data:
-            if _is_valid_marketplace_name(k):
-                names.append(k)
-            else:
-                invalid.append(k)
+        names, invalid = _validated_marketplaces(
+            str(KNOWN_MARKETPLACES_FILE), st.st_mtime_ns, st.st_size
+        )
         if invalid:
             log(f"Skipping invalid marketplace names: {', '.join(invalid)}")
         log(f"Found {len(names)} marketplace(s): {', '.join(names)}")
-        return names
+        return list(names)
     except Exception as e:
         log(f"Error reading known marketplaces: {e}")
         return []
@@ -415,7 +726,8 @@ def _update_single_marketplace(name: str) -> bool:
     try:
         log(f"Updating marketplace: {label}...")
         result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=COMMAND_TIMEOUT_LONG, check=False
+            cmd, executable=_claude_executable(), close_fds=False, stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE, text=True, timeout=COMMAND_TIMEOUT_LONG, check=False
         )
 
         if result.returncode == 0:
@@ -433,24 +745,31 @@ def _update_single_marketplace(name: str) -> bool:
 
 
 def update_all_marketplaces() -> int:
-    """逐个更新所有 Marketplaces，返回成功更新的数量
+    """并发更新所有 Marketplaces，返回成功更新的数量
 
     读取 known_marketplaces.json 获取所有 marketplace 名称，
-    逐个执行 `claude plugin marketplace update <name>`。
+    并发执行 `claude plugin marketplace update <name>`。
     如果读取失败，回退到无参数命令（只更新官方 marketplace）。
     """
     marketplaces = get_all_marketplaces()
 
     if not marketplaces:
-        log("No marketplaces found, falling back to default update command")
+        log("No marketplaces found, falling back to default update command", flush=True)
         return 1 if _update_single_marketplace("") else 0
 
-    log(f"Updating {len(marketplaces)} marketplace(s)...")
-    success_count = sum(1 for name in marketplaces if _update_single_marketplace(name))
+    log(f"Updating {len(marketplaces)} marketplace(s)...", flush=True)
+    success_count = sum(_run_parallel(_update_single_marketplace, marketplaces))
+    # claude CLI 会改写 known_marketplaces.json，显式丢弃缓存
+    _invalidate_json_cache()
     log(f"Marketplace update completed: {success_count}/{len(marketplaces)} successful")
     return success_count
 
 
+# claude CLI 输出以字节形式检查，省去解码和 lower() 产生的副本
+_NOT_INSTALLED_RE = re.compile(rb"not installed", re.IGNORECASE)
+_NO_PLUGINS_RE = re.compile(rb"no plugins installed", re.IGNORECASE)
+
+
 def _update_single_plugin(plugin_name: str) -> bool:
     """更新单个插件，返回是否成功
 
@@ -463,27 +782,28 @@ def _update_single_plugin(plugin_name: str) -> bool:
     try:
         log(f"Updating {plugin_name}...")
         cmd = ["claude", "plugin", "update", plugin_name]
+        # stderr 合并到 stdout：claude CLI 可能将错误输出到任一流，只需检查一份输出
         result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=COMMAND_TIMEOUT_LONG, check=False
+            cmd, executable=_claude_executable(), close_fds=False, stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, timeout=COMMAND_TIMEOUT_LONG, check=False
         )
 
         # 如果完整名称找不到，尝试使用基础名称重试
-        # 检查 stdout + stderr，因为 claude CLI 可能将错误输出到任一流
-        combined_output = (result.stdout + result.stderr).lower()
-        if result.returncode != 0 and "not installed" in combined_output:
+        if result.returncode != 0 and _NOT_INSTALLED_RE.search(result.stdout):
             base_name = plugin_name.split("@")[0]
             log(f"Retrying with base name: {base_name}...")
             cmd = ["claude", "plugin", "update", base_name]
             result = subprocess.run(
-                cmd, capture_output=True, text=True, timeout=COMMAND_TIMEOUT_LONG, check=False
+                cmd, executable=_claude_executable(), close_fds=False, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT, timeout=COMMAND_TIMEOUT_LONG, check=False
             )
 
         if result.returncode == 0:
             log(f"✓ Updated {plugin_name}")
             return True
 
-        error_msg = result.stderr.strip() or result.stdout.strip()
-        log(f"✗ Failed to update {plugin_name}: {error_msg}")
+        output = result.stdout.decode("utf-8", errors="replace").strip()
+        log(f"✗ Failed to update {plugin_name}: {output}")
         return False
     except subprocess.TimeoutExpired:
         log(f"✗ Timeout updating {plugin_name}")
@@ -493,6 +813,10 @@ def _update_single_plugin(plugin_name: str) -> bool:
         return False
 
 
+# is_plugin_management_available() 的探测结果缓存（None 表示尚未探测）
+_plugin_management_available: Optional[bool] = None
+
+
 def is_plugin_management_available() -> bool:
     """检查 claude plugin 命令是否可用
 
@@ -502,18 +826,26 @@ def is_plugin_management_available() -> bool:
 
     通过对比 CLI 输出与 installed_plugins.json 来检测此情况：
     若 CLI 报告无插件但 JSON 中有插件，说明功能被禁用。
+    探测结果在进程内缓存，只执行一次 `claude plugin list`。
     """
+    global _plugin_management_available
+    if _plugin_management_available is None:
+        _plugin_management_available = _probe_plugin_management()
+    return _plugin_management_available
+
+
+def _probe_plugin_management() -> bool:
+    """执行一次 is_plugin_management_available() 的实际探测"""
     installed = get_installed_plugins()
     if not installed:
         return True  # 无已安装插件，无法判断，允许尝试
 
     try:
         result = subprocess.run(
-            ["claude", "plugin", "list"],
-            capture_output=True, text=True, timeout=30, check=False
+            ["claude", "plugin", "list"], executable=_claude_executable(), close_fds=False,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=30, check=False
         )
-        combined = (result.stdout + result.stderr).lower()
-        if "no plugins installed" in combined:
+        if _NO_PLUGINS_RE.search(result.stdout):
             log(
                 "⚠ Plugin update unavailable: versioned plugins feature flag is disabled "
                 "(tengu_enable_versioned_plugins=false). "
@@ -527,7 +859,7 @@ def is_plugin_management_available() -> bool:
 
 
 def update_all_plugins() -> int:
-    """更新所有已安装的插件（跳过本地插件）"""
+    """并发更新所有已安装的插件（跳过本地插件）"""
     installed = get_installed_plugins()
 
     if not installed:
@@ -547,45 +879,141 @@ def update_all_plugins() -> int:
         log("No remote plugins to update")
         return 0
 
-    log(f"Updating {len(remote_plugins)} plugin(s)...")
-    success_count = sum(1 for name in remote_plugins if _update_single_plugin(name))
+    log(f"Updating {len(remote_plugins)} plugin(s)...", flush=True)
+    success_count = sum(_run_parallel(_update_single_plugin, remote_plugins))
+    # claude CLI 会改写 installed_plugins.json，显式丢弃缓存
+    _invalidate_json_cache()
     fail_count = len(remote_plugins) - success_count
     log(f"Update completed: {success_count} updated, {fail_count} failed")
     return success_count
 
 
-def update_timestamp() -> None:
-    """更新时间戳"""
-    timestamp = datetime.now(timezone.utc).isoformat()
-    LAST_UPDATE_FILE.write_text(timestamp + "\n")
+def update_timestamp(now: Optional[datetime] = None) -> None:
+    """更新时间戳（默认取调用时刻，main() 传入本次运行的当前时间）
+
+    文件 mtime 同步设为该时间，_seconds_since_last_run() 只需 stat 即可判断。
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    timestamp = now.isoformat()
+    _replace_file(LAST_UPDATE_FILE, (timestamp + "\n").encode("utf-8"), fsync=True)
+    os.utime(LAST_UPDATE_FILE, (now.timestamp(), now.timestamp()))
     log(f"Updated timestamp: {timestamp}")
 
 
 def get_local_marketplaces() -> Set[str]:
     """获取本地已知 marketplace 名称集合"""
-    if not KNOWN_MARKETPLACES_FILE.exists():
-        return set()
     try:
-        data = json.loads(KNOWN_MARKETPLACES_FILE.read_text())
+        data = _read_json_cached(KNOWN_MARKETPLACES_FILE)
         return set(data.keys())
     except Exception:
         return set()
 
 
+def _keys_digest(plugins: Set[str], marketplaces: Set[str]) -> str:
+    """计算插件名与 marketplace 名集合的摘要（与顺序无关）"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update("\0".join(sorted(plugins)).encode("utf-8"))
+    h.update(b"\1")
+    h.update("\0".join(sorted(marketplaces)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _snapshot_inputs_signature() -> Optional[List[int]]:
+    """返回快照变化检测全部输入文件的 mtime/大小，任一文件不存在时返回 None
+
+    输入文件: 快照、installed_plugins.json、known_marketplaces.json
+    """
+    paths = (CURRENT_SNAPSHOT, CLAUDE_DIR / "plugins" / "installed_plugins.json", KNOWN_MARKETPLACES_FILE)
+    try:
+        stats = [os.stat(path) for path in paths]
+    except OSError:
+        return None
+    return [value for st in stats for value in (st.st_mtime_ns, st.st_size)]
+
+
+def _load_snapshot_keys_hash() -> Dict[str, Any]:
+    """读取快照键摘要缓存，读取失败时返回空字典"""
+    try:
+        return json.loads(SNAPSHOT_KEYS_HASH.read_bytes())
+    except Exception:
+        return {}
+
+
+def _save_snapshot_keys_hash(
+    snapshot_sig: List[int], digest: str, inputs_sig: Optional[List[int]]
+) -> None:
+    """保存快照键摘要缓存（写入失败不影响主流程）
+
+    参数:
+        snapshot_sig: 快照文件的 mtime/大小
+        digest: 快照中插件名/marketplace 名集合的摘要
+        inputs_sig: 确认无变化时全部输入文件的签名，有变化时为 None
+    """
+    record = {"snapshot": snapshot_sig, "digest": digest, "inputs": inputs_sig}
+    try:
+        SNAPSHOT_KEYS_HASH.write_text(json.dumps(record) + "\n")
+    except OSError as e:
+        log(f"Warning: failed to write snapshot keys hash: {e}")
+
+
+def _refresh_snapshot_keys_hash() -> None:
+    """快照重建后刷新 SNAPSHOT_KEYS_HASH，下次运行无需再解析快照
+
+    新快照的集合与当前本地集合一致时一并记录输入签名，
+    输入文件未变化时下次检测直接返回。
+    """
+    try:
+        snapshot_stat = os.stat(CURRENT_SNAPSHOT)
+        snapshot = _read_json_cached(CURRENT_SNAPSHOT)
+    except (OSError, ValueError) as e:
+        log(f"Warning: failed to refresh snapshot keys hash: {e}")
+        return
+
+    digest = _keys_digest(set(snapshot.get("plugins", {})), set(snapshot.get("marketplaces", {})))
+    current_digest = _keys_digest({p for p in get_installed_plugins() if "@" in p}, get_local_marketplaces())
+    _save_snapshot_keys_hash(
+        [snapshot_stat.st_mtime_ns, snapshot_stat.st_size],
+        digest,
+        _snapshot_inputs_signature() if digest == current_digest else None,
+    )
+
+
 def snapshot_has_changes() -> bool:
-    """检查快照是否有实质性变化（插件列表或 marketplace 列表变化）"""
+    """检查快照是否有实质性变化（插件列表或 marketplace 列表变化）
+
+    SNAPSHOT_KEYS_HASH 缓存两级结果：
+    - 上次确认无变化时全部输入文件的签名，均未变化时直接返回，不解析任何文件
+    - 快照中插件名/marketplace 名集合的摘要（按快照 mtime/大小失效），
+      当前集合摘要相同时无需解析快照
+    """
     if not CURRENT_SNAPSHOT.exists():
         return True  # 没有快照，肯定有变化
 
     try:
-        old_snapshot = json.loads(CURRENT_SNAPSHOT.read_text())
-        old_plugins = set(old_snapshot.get("plugins", {}).keys())
-        old_marketplaces = set(old_snapshot.get("marketplaces", {}).keys())
+        cached = _load_snapshot_keys_hash()
+        inputs_sig = _snapshot_inputs_signature()
+        if inputs_sig is not None and cached.get("inputs") == inputs_sig:
+            log("Plugin list and marketplace list unchanged, no need to sync to Git")
+            return False
 
         # 过滤掉本地插件（无 @ 后缀），与快照中的插件列表保持一致
         current_plugins = {p for p in get_installed_plugins() if "@" in p}
         current_marketplaces = get_local_marketplaces()
 
+        snapshot_stat = os.stat(CURRENT_SNAPSHOT)
+        snapshot_sig = [snapshot_stat.st_mtime_ns, snapshot_stat.st_size]
+        current_digest = _keys_digest(current_plugins, current_marketplaces)
+        if cached.get("snapshot") == snapshot_sig and cached.get("digest") == current_digest:
+            if cached.get("inputs") != inputs_sig:
+                _save_snapshot_keys_hash(snapshot_sig, current_digest, inputs_sig)
+            log("Plugin list and marketplace list unchanged, no need to sync to Git")
+            return False
+
+        old_snapshot = _read_json_cached(CURRENT_SNAPSHOT)
+        old_plugins = set(old_snapshot.get("plugins", {}).keys())
+        old_marketplaces = set(old_snapshot.get("marketplaces", {}).keys())
+
         changed = False
 
         if old_plugins != current_plugins:
@@ -606,6 +1034,10 @@ def snapshot_has_changes() -> bool:
                 log(f"Removed marketplaces detected: {', '.join(removed)}")
             changed = True
 
+        _save_snapshot_keys_hash(
+            snapshot_sig, _keys_digest(old_plugins, old_marketplaces), None if changed else inputs_sig
+        )
+
         if not changed:
             log("Plugin list and marketplace list unchanged, no need to sync to Git")
         return changed
@@ -614,39 +1046,86 @@ def snapshot_has_changes() -> bool:
         return True  # 出错时保守处理，认为有变化
 
 
+def _load_module(name: str, path: Path) -> Any:
+    """从文件加载模块（脚本文件名含连字符，无法直接 import）"""
+    import importlib.util  # 延迟导入：仅在加载辅助脚本时需要
+
+    spec = importlib.util.spec_from_file_location(name, str(path))
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Cannot load script: {path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@functools.lru_cache(maxsize=None)
+def _load_script(filename: str) -> Any:
+    """在本进程内加载 scripts/ 下的辅助脚本（每个进程只加载一次）
+
+    相比启动 python3 子进程，省去解释器启动和重复导入的开销。
+    """
+    path = AUTO_MANAGER_DIR / "scripts" / filename
+    return _load_module(path.stem.replace("-", "_"), path)
+
+
 def create_new_snapshot() -> bool:
-    """创建新快照"""
+    """创建新快照（在本进程内调用 create-snapshot.py）"""
     try:
         log("Creating new snapshot...")
-        cmd = [
-            "python3",
-            str(AUTO_MANAGER_DIR / "scripts" / "create-snapshot.py"),
-        ]
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=COMMAND_TIMEOUT_SHORT, check=False
-        )
+        _load_script("create-snapshot.py").create_snapshot()
+        # 快照由 create-snapshot.py 直接改写，不依赖 mtime 判断，显式丢弃缓存
+        _invalidate_json_cache(CURRENT_SNAPSHOT)
+        log("✓ Snapshot created")
+        _refresh_snapshot_keys_hash()
+        return True
+    except Exception as e:
+        log(f"✗ Error creating snapshot: {e}")
+        return False
 
-        if result.returncode == 0:
-            log("✓ Snapshot created")
-            return True
 
-        log(f"✗ Failed to create snapshot: {result.stderr}")
+def _remote_head_matches_local() -> bool:
+    """判断远程 main 与本地 HEAD 是否为同一提交
+
+    git ls-remote 只交换引用列表，不协商也不下载对象；
+    任一命令失败或超时时返回 False，由调用方照常执行 git pull。
+    """
+    cwd = str(AUTO_MANAGER_DIR)
+    try:
+        local = subprocess.run(
+            ["git", "rev-parse", "HEAD"], executable=_git_executable(), capture_output=True, text=True,
+            timeout=GIT_LS_REMOTE_TIMEOUT, cwd=cwd, check=False,
+        )
+        if local.returncode != 0:
+            return False
+        remote = subprocess.run(
+            ["git", "ls-remote", "origin", "refs/heads/main"], executable=_git_executable(),
+            capture_output=True, text=True,
+            timeout=GIT_LS_REMOTE_TIMEOUT, cwd=cwd, check=False,
+        )
+    except (subprocess.TimeoutExpired, OSError):
         return False
-    except Exception as e:
-        log(f"✗ Error creating snapshot: {e}")
+    if remote.returncode != 0:
         return False
+    remote_sha = remote.stdout.split("\t", 1)[0].strip()
+    return bool(remote_sha) and remote_sha == local.stdout.strip()
 
 
 def sync_self_repo() -> bool:
     """同步 auto-manager 仓库自身（git pull），获取最新快照和配置
 
     在所有操作之前执行，确保使用最新的快照和配置文件。
+    先用 git ls-remote 比较远程与本地 HEAD，一致时跳过 git pull。
     失败不影响后续流程。
     """
     try:
-        log("Syncing auto-manager repo (git pull --rebase)...")
+        if _remote_head_matches_local():
+            log("✓ Auto-manager repo already up to date")
+            return True
+
+        log("Syncing auto-manager repo (git pull --rebase)...", flush=True)
         result = subprocess.run(
             ["git", "pull", "--rebase", "origin", "main"],
+            executable=_git_executable(),
             capture_output=True,
             text=True,
             timeout=COMMAND_TIMEOUT_SHORT,
@@ -673,40 +1152,44 @@ def sync_self_repo() -> bool:
         return False
 
 
-def ensure_self_registered() -> None:
+def ensure_self_registered(now: Optional[datetime] = None) -> None:
     """确保 auto-manager 自身在 installed_plugins.json 中注册
 
     Claude Code 的插件操作可能会重建 installed_plugins.json，
     导致本地插件 auto-manager 的注册信息丢失，Hook 不再被触发。
     每次启动时检查并修复。
+
+    参数:
+        now: 本次运行的当前时间（默认取调用时刻），main() 传入同一值保证时间戳一致
     """
     installed_file = CLAUDE_DIR / "plugins" / "installed_plugins.json"
-    if not installed_file.exists():
-        return
-
     try:
-        data = json.loads(installed_file.read_text())
-        plugins = data.get("plugins", {})
-
-        if "auto-manager" in plugins:
+        # 与 get_installed_plugins() 共享同一份解析结果；只在需要写入时才复制
+        try:
+            cached = _read_json_cached(installed_file)
+        except FileNotFoundError:
             return
+        if "auto-manager" in cached.get("plugins", {}):
+            return
+
+        data = dict(cached)
+        plugins = dict(data.get("plugins", {}))
 
         log("auto-manager not found in installed_plugins.json, re-registering...")
-        now = datetime.now(timezone.utc).isoformat()
+        now_iso = (now or datetime.now(timezone.utc)).isoformat()
         plugins["auto-manager"] = [
             {
                 "scope": "user",
                 "installPath": str(AUTO_MANAGER_DIR),
                 "version": "1.0.0",
-                "installedAt": now,
-                "lastUpdated": now,
+                "installedAt": now_iso,
+                "lastUpdated": now_iso,
             }
         ]
         data["plugins"] = plugins
 
-        temp_file = installed_file.with_suffix(".json.tmp")
-        temp_file.write_text(json.dumps(data, indent=4) + "\n")
-        temp_file.rename(installed_file)
+        # 写入的数据直接作为缓存，后续 get_installed_plugins() 无需重新解析
+        _atomic_write_json(installed_file, data, indent=4, fsync=True, prime_cache=True)
         log("✓ auto-manager re-registered in installed_plugins.json")
     except Exception as e:
         log(f"Error ensuring self-registration: {e}")
@@ -743,54 +1226,43 @@ def ensure_global_hook() -> None:
     同时升级已有的旧配置（缺少 matcher 或 async 字段）为最新版本。
     """
     try:
-        data = json.loads(GLOBAL_SETTINGS_LOCAL.read_text(encoding="utf-8")) if GLOBAL_SETTINGS_LOCAL.exists() else {}
+        try:
+            data = json.loads(GLOBAL_SETTINGS_LOCAL.read_bytes())
+        except FileNotFoundError:
+            data = {}
 
         script_path = str(SESSION_START_SCRIPT)
         session_start_hooks = data.get("hooks", {}).get("SessionStart", [])
 
-        # 查找已有的 Hook 条目
-        existing_idx = None
-        existing_hook_idx = None
-        needs_upgrade = False
+        # 单次遍历建立 command → (分组索引, Hook 索引) 索引，保留首次出现的位置
+        hook_index: Dict[Any, Tuple[int, int]] = {}
         for i, hook_group in enumerate(session_start_hooks):
-            for j, hook in enumerate(hook_group.get("hooks", [])):
-                if hook.get("command") == script_path:
-                    existing_idx = i
-                    existing_hook_idx = j
-                    has_matcher = "matcher" in hook_group
-                    has_async = hook.get("async") is True
-                    has_correct_timeout = hook.get("timeout") == HOOK_TIMEOUT
-                    needs_upgrade = not has_matcher or not has_async or not has_correct_timeout
-                    break
-            if existing_idx is not None:
-                break
-
-        if existing_idx is not None and not needs_upgrade:
-            log("Global hook already configured in settings.local.json")
-            return
-
-        if needs_upgrade:
-            hook_group = session_start_hooks[existing_idx]
-            if "matcher" not in hook_group:
-                hook_group["matcher"] = "startup"
+            for j, hook in enumerate(hook_group.get("hooks", ())):
+                hook_index.setdefault(hook.get("command"), (i, j))
 
-            hook_entry = hook_group.get("hooks", [])[existing_hook_idx]
-            if hook_entry.get("async") is not True:
-                hook_entry["async"] = True
-            if hook_entry.get("timeout") != HOOK_TIMEOUT:
-                hook_entry["timeout"] = HOOK_TIMEOUT
-            log("Upgrading global hook (adding matcher/async/timeout)")
-        else:
+        existing = hook_index.get(script_path)
+        if existing is None:
             # 新增条目
             data.setdefault("hooks", {}).setdefault("SessionStart", []).append(
                 _build_hook_entry(script_path)
             )
+        else:
+            hook_group = session_start_hooks[existing[0]]
+            hook_entry = hook_group["hooks"][existing[1]]
+            if (
+                "matcher" in hook_group
+                and hook_entry.get("async") is True
+                and hook_entry.get("timeout") == HOOK_TIMEOUT
+            ):
+                log("Global hook already configured in settings.local.json")
+                return
 
-        # 原子写入
-        GLOBAL_SETTINGS_LOCAL.parent.mkdir(parents=True, exist_ok=True)
-        temp_file = GLOBAL_SETTINGS_LOCAL.with_suffix(".json.tmp")
-        temp_file.write_text(json.dumps(data, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
-        temp_file.rename(GLOBAL_SETTINGS_LOCAL)
+            hook_group.setdefault("matcher", "startup")
+            hook_entry["async"] = True
+            hook_entry["timeout"] = HOOK_TIMEOUT
+            log("Upgrading global hook (adding matcher/async/timeout)")
+
+        _atomic_write_json(GLOBAL_SETTINGS_LOCAL, data)
         log(f"✓ Global hook configured in {GLOBAL_SETTINGS_LOCAL}")
     except Exception as e:
         log(f"Error ensuring global hook: {e}")
@@ -808,9 +1280,7 @@ def ensure_startup_service() -> None:
             log("startup-service.py not found, skipping OS service check")
             return
 
-        spec = importlib.util.spec_from_file_location("startup_service", str(STARTUP_SERVICE_SCRIPT))
-        startup_service = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(startup_service)
+        startup_service = _load_module("startup_service", STARTUP_SERVICE_SCRIPT)
 
         if startup_service.is_service_installed():
             log("OS startup service already installed")
@@ -827,26 +1297,19 @@ def ensure_startup_service() -> None:
 
 
 def sync_to_git(config: Dict[str, Any]) -> bool:
-    """同步快照到 Git 仓库"""
+    """同步快照到 Git 仓库（在本进程内调用 git-sync.py）"""
     if not config["git_sync"]["enabled"]:
         log("Git sync is disabled in config")
         return False
 
     try:
-        log("Syncing to Git...")
-        cmd = [
-            "python3",
-            str(AUTO_MANAGER_DIR / "scripts" / "git-sync.py"),
-        ]
-        result = subprocess.run(
-            cmd, capture_output=True, text=True, timeout=COMMAND_TIMEOUT_SHORT, check=False
-        )
-
-        if result.returncode == 0:
+        log("Syncing to Git...", flush=True)
+        # 与原先子进程的超时一致：所有 Git 命令共享 COMMAND_TIMEOUT_SHORT 的总时间
+        if _load_script("git-sync.py").sync_to_git(time_budget=COMMAND_TIMEOUT_SHORT):
             log("✓ Git sync completed")
             return True
 
-        log(f"✗ Failed to sync to Git: {result.stderr}")
+        log("✗ Failed to sync to Git")
         return False
     except Exception as e:
         log(f"✗ Error syncing to Git: {e}")
@@ -859,19 +1322,21 @@ def sync_marketplaces_from_snapshot() -> int:
     只添加缺失的 marketplace，不删除现有的。
     返回新添加的 marketplace 数量。
     """
-    if not CURRENT_SNAPSHOT.exists():
-        return 0
-
     try:
-        snapshot = json.loads(CURRENT_SNAPSHOT.read_text())
+        try:
+            snapshot = _read_json_cached(CURRENT_SNAPSHOT)
+        except FileNotFoundError:
+            return 0
         snapshot_marketplaces = snapshot.get("marketplaces", {})
 
         if not snapshot_marketplaces:
             return 0
 
-        local_data: Dict[str, Any] = {}
-        if KNOWN_MARKETPLACES_FILE.exists():
-            local_data = json.loads(KNOWN_MARKETPLACES_FILE.read_text())
+        try:
+            # 需要修改后写回，复制一份避免污染共享缓存
+            local_data: Dict[str, Any] = dict(_read_json_cached(KNOWN_MARKETPLACES_FILE))
+        except FileNotFoundError:
+            local_data = {}
 
         missing = {
             name: info
@@ -896,19 +1361,16 @@ def sync_marketplaces_from_snapshot() -> int:
             }
             log(f"Adding marketplace: {name} ({info.get('repo', 'unknown')})")
 
-        # 原子写入
-        KNOWN_MARKETPLACES_FILE.parent.mkdir(parents=True, exist_ok=True)
-        temp_file = KNOWN_MARKETPLACES_FILE.with_suffix(".json.tmp")
-        temp_file.write_text(json.dumps(local_data, indent=2) + "\n")
-        temp_file.rename(KNOWN_MARKETPLACES_FILE)
-        log(f"✓ Added {len(missing)} marketplace(s) to known_marketplaces.json")
+        _atomic_write_json(KNOWN_MARKETPLACES_FILE, local_data)
+        log(f"✓ Added {len(missing)} marketplace(s) to known_marketplaces.json", flush=True)
 
         # 立即 fetch 新 marketplace 的插件列表（不在 Claude 会话中执行，避免嵌套错误）
-        if not is_in_claude_session():
-            for name in missing:
-                _update_single_marketplace(name)
-        else:
+        if is_in_claude_session():
             log("Skipping marketplace fetch (running inside Claude session)")
+        elif _claude_executable() is None:
+            log("Skipping marketplace fetch (claude CLI not found)")
+        else:
+            _run_parallel(_update_single_marketplace, list(missing))
 
         return len(missing)
     except Exception as e:
@@ -916,6 +1378,34 @@ def sync_marketplaces_from_snapshot() -> int:
         return 0
 
 
+def _target_matches(source: Union[str, Path], target: Union[str, Path]) -> bool:
+    """判断目标文件内容是否与源文件相同
+
+    filecmp 先比较文件大小，大小不同（或目标不存在）时无需读取内容；
+    大小相同时分块比较字节，遇到第一处差异即返回，不解码也不整体读入内存。
+    """
+    try:
+        return filecmp.cmp(source, target, shallow=False)
+    except FileNotFoundError:
+        return False
+
+
+def _write_synced_file(target: Union[str, Path], content: bytes) -> None:
+    """将 content 写入 target
+
+    目标不存在时以 O_EXCL 直接创建，无需临时文件；
+    已存在时通过 _replace_file() 原子覆盖。
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        fd = os.open(target, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        _replace_file(target, content)
+        return
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+
+
 def sync_global_rules(config: Dict[str, Any]) -> None:
     """将仓库中的全局规则同步到 ~/.claude/CLAUDE.md
 
@@ -931,73 +1421,115 @@ def sync_global_rules(config: Dict[str, Any]) -> None:
         return
 
     try:
-        source_content = GLOBAL_RULES_SOURCE.read_text(encoding="utf-8")
-
         # 只在内容变化时更新
-        if GLOBAL_RULES_TARGET.exists():
-            target_content = GLOBAL_RULES_TARGET.read_text(encoding="utf-8")
-            if source_content == target_content:
-                log("Global rules unchanged, skipping sync")
-                return
-
-        # 确保目标目录存在
-        GLOBAL_RULES_TARGET.parent.mkdir(parents=True, exist_ok=True)
+        if _target_matches(GLOBAL_RULES_SOURCE, GLOBAL_RULES_TARGET):
+            log("Global rules unchanged, skipping sync")
+            return
 
-        # 使用临时文件 + rename 实现原子写入
-        temp_file = GLOBAL_RULES_TARGET.with_suffix(".md.tmp")
-        temp_file.write_text(source_content, encoding="utf-8")
-        temp_file.rename(GLOBAL_RULES_TARGET)
+        _write_synced_file(GLOBAL_RULES_TARGET, GLOBAL_RULES_SOURCE.read_bytes())
         log(f"✓ Global rules synced to {GLOBAL_RULES_TARGET}")
     except Exception as e:
         log(f"Error syncing global rules: {e}")
 
 
+def _skill_sync_signature(source_stat: os.stat_result, target_file: str) -> Optional[List[int]]:
+    """返回源/目标 SKILL.md 的 mtime 与大小；目标文件不存在时返回 None"""
+    try:
+        target_stat = os.stat(target_file)
+    except FileNotFoundError:
+        return None
+    return [
+        source_stat.st_mtime_ns, source_stat.st_size,
+        target_stat.st_mtime_ns, target_stat.st_size,
+    ]
+
+
+def _load_skills_sync_cache() -> Dict[str, List[int]]:
+    """读取上次确认源/目标一致时记录的各 skill 文件签名"""
+    try:
+        return json.loads(SKILLS_SYNC_CACHE.read_bytes())
+    except Exception:
+        return {}
+
+
+def _sync_one_skill(name: str, cache: Dict[str, List[int]]) -> Tuple[bool, Optional[List[int]]]:
+    """同步单个 skill 的 SKILL.md，返回 (是否写入, 同步后的文件签名)
+
+    源文件不存在或同步失败时签名为 None，不写入缓存。
+
+    参数:
+        name: skill 目录名
+        cache: 上次确认源/目标一致时记录的签名
+    """
+    # 循环内直接拼接字符串路径，避免为每个 skill 构造多个 Path 对象
+    source_file = os.path.join(GLOBAL_SKILLS_SOURCE_DIR, name, "SKILL.md")
+    try:
+        source_stat = os.stat(source_file)
+    except FileNotFoundError:
+        return False, None
+
+    target_file = os.path.join(GLOBAL_SKILLS_TARGET_DIR, name, "SKILL.md")
+    try:
+        signature = _skill_sync_signature(source_stat, target_file)
+        if signature is not None and cache.get(name) == signature:
+            return False, signature
+
+        # 只在内容变化时更新
+        if _target_matches(source_file, target_file):
+            return False, signature
+
+        with open(source_file, "rb") as f:
+            _write_synced_file(target_file, f.read())
+        log(f"✓ Synced skill: {name}")
+        return True, _skill_sync_signature(source_stat, target_file)
+    except Exception as e:
+        log(f"Error syncing skill {name}: {e}")
+        return False, None
+
+
 def sync_global_skills(config: Dict[str, Any]) -> None:
     """将仓库中的 global-skills/ 同步到 ~/.claude/skills/
 
     遍历 global-skills/ 下的每个子目录，将 SKILL.md 同步到对应的目标目录。
     只在源文件存在且内容有变化时更新。
+
+    源和目标文件的 mtime/大小与上次确认一致时的记录相同时，不再读取文件内容。
+    各 skill 互不依赖，通过 _run_parallel() 并发同步。
     """
     global_skills_sync = config.get("global_skills_sync", {})
     if not global_skills_sync.get("enabled", False):
         log("Global skills sync is disabled in config")
         return
 
-    if not GLOBAL_SKILLS_SOURCE_DIR.exists():
+    # scandir 的 DirEntry 自带目录项类型，避免逐个 is_dir()/exists() 的额外 stat
+    try:
+        with os.scandir(GLOBAL_SKILLS_SOURCE_DIR) as it:
+            skill_entries = [entry for entry in it if entry.is_dir()]
+    except FileNotFoundError:
         log("Global skills source directory not found, skipping sync")
         return
+    except OSError as e:
+        log(f"Error syncing global skills: {e}")
+        return
 
     try:
-        synced = 0
-        for skill_dir in GLOBAL_SKILLS_SOURCE_DIR.iterdir():
-            if not skill_dir.is_dir():
-                continue
-
-            source_file = skill_dir / "SKILL.md"
-            if not source_file.exists():
-                continue
+        cache = _load_skills_sync_cache()
+        names = [entry.name for entry in skill_entries]
+        results = _run_parallel(functools.partial(_sync_one_skill, cache=cache), names)
 
-            target_dir = GLOBAL_SKILLS_TARGET_DIR / skill_dir.name
-            target_file = target_dir / "SKILL.md"
+        synced = 0
+        new_cache: Dict[str, List[int]] = {}
+        for name, (written, signature) in zip(names, results):
+            if written:
+                synced += 1
+            if signature is not None:
+                new_cache[name] = signature
 
+        if new_cache != cache:
             try:
-                source_content = source_file.read_text(encoding="utf-8")
-
-                # 只在内容变化时更新
-                if target_file.exists():
-                    target_content = target_file.read_text(encoding="utf-8")
-                    if source_content == target_content:
-                        continue
-
-                target_dir.mkdir(parents=True, exist_ok=True)
-
-                temp_file = target_file.with_suffix(".md.tmp")
-                temp_file.write_text(source_content, encoding="utf-8")
-                temp_file.rename(target_file)
-                log(f"✓ Synced skill: {skill_dir.name}")
-                synced += 1
-            except Exception as e:
-                log(f"Error syncing skill {skill_dir.name}: {e}")
+                SKILLS_SYNC_CACHE.write_text(json.dumps(new_cache) + "\n")
+            except OSError as e:
+                log(f"Warning: failed to write skills sync cache: {e}")
 
         if synced > 0:
             log(f"Synced {synced} skill(s) to {GLOBAL_SKILLS_TARGET_DIR}")
@@ -1013,195 +1545,292 @@ def cleanup_claude_backups() -> None:
     只删除 ~/.claude.json.backup.<timestamp> 格式的文件
     保留 ~/.claude.json.backup（主备份文件）
     """
+    prefix = ".claude.json.backup."
     try:
-        claude_json = CLAUDE_DIR / ".claude.json"
-        parent_dir = claude_json.parent
-
         # 查找所有 .claude.json.backup.* 文件
-        backup_files = list(parent_dir.glob(".claude.json.backup.*"))
+        try:
+            with os.scandir(CLAUDE_DIR) as it:
+                backup_names = sorted(entry.name for entry in it if entry.name.startswith(prefix))
+        except FileNotFoundError:
+            backup_names = []
 
-        if not backup_files:
+        if not backup_names:
             log("No timestamped backup files to clean up")
             return
 
-        log(f"Found {len(backup_files)} timestamped backup files to clean up")
+        log(f"Found {len(backup_names)} timestamped backup files to clean up")
 
-        # 删除所有带时间戳的备份文件
-        deleted_count = 0
-        for backup_file in backup_files:
-            try:
-                backup_file.unlink()
-                log(f"Deleted: {backup_file.name}")
-                deleted_count += 1
-            except Exception as e:
-                log(f"Failed to delete {backup_file.name}: {e}")
-
-        if deleted_count > 0:
-            log(f"✓ Cleaned up {deleted_count} backup file(s)")
+        # 支持 dir_fd 的平台上相对已打开的目录删除，省去逐个文件的路径解析
+        dir_fd = os.open(CLAUDE_DIR, os.O_RDONLY) if os.unlink in os.supports_dir_fd else None
+
+        # 删除所有带时间戳的备份文件，成功的只汇总记录一行日志
+        deleted: List[str] = []
+        try:
+            for name in backup_names:
+                try:
+                    if dir_fd is None:
+                        os.unlink(os.path.join(CLAUDE_DIR, name))
+                    else:
+                        os.unlink(name, dir_fd=dir_fd)
+                    deleted.append(name)
+                except OSError as e:
+                    log(f"Failed to delete {name}: {e}")
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
+
+        if deleted:
+            log(f"✓ Cleaned up {len(deleted)} backup file(s): {', '.join(deleted)}")
     except Exception as e:
         log(f"Error during backup cleanup: {e}")
 
 
+# 通知消息转义表：str.translate 单次遍历完成所有替换
+_APPLESCRIPT_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"'})
+_POWERSHELL_ESCAPES = str.maketrans({'"': '`"', "$": "`$"})
+
+
 def escape_for_applescript(text: str) -> str:
     """转义 AppleScript 字符串中的特殊字符"""
-    return text.replace('\\', '\\\\').replace('"', '\\"')
+    return text.translate(_APPLESCRIPT_ESCAPES)
 
 
 def escape_for_powershell(text: str) -> str:
     """转义 PowerShell 字符串中的特殊字符"""
-    return text.replace('"', '`"').replace('$', '`$')
+    return text.translate(_POWERSHELL_ESCAPES)
+
+
+# Windows Toast 通知脚本，__TEXT__ 替换为转义后的通知内容
+_POWERSHELL_TOAST_SCRIPT = (
+    "[Windows.UI.Notifications.ToastNotificationManager, Windows.UI.Notifications, "
+    "ContentType = WindowsRuntime] | Out-Null\n"
+    "$template = [Windows.UI.Notifications.ToastNotificationManager]::GetTemplateContent("
+    "[Windows.UI.Notifications.ToastTemplateType]::ToastText02)\n"
+    "$toastXml = [xml] $template.GetXml()\n"
+    '$toastXml.GetElementsByTagName("text")[0].AppendChild($toastXml.CreateTextNode("Claude Plugins")) | Out-Null\n'
+    '$toastXml.GetElementsByTagName("text")[1].AppendChild($toastXml.CreateTextNode("__TEXT__")) | Out-Null\n'
+    "$xml = New-Object Windows.Data.Xml.Dom.XmlDocument\n"
+    "$xml.LoadXml($toastXml.OuterXml)\n"
+    "$toast = [Windows.UI.Notifications.ToastNotification]::new($xml)\n"
+    '[Windows.UI.Notifications.ToastNotificationManager]::CreateToastNotifier("Claude Plugins").Show($toast)\n'
+)
+
+# 各平台发送通知使用的命令
+_NOTIFIERS = {"Darwin": "osascript", "Linux": "notify-send", "Windows": "powershell"}
+
+
+@functools.lru_cache(maxsize=1)
+def _platform_system() -> str:
+    """返回 platform.system()（延迟导入 platform，每个进程只查询一次）"""
+    import platform
+
+    return platform.system()
+
+
+@functools.lru_cache(maxsize=None)
+def _notifier_executable(name: str) -> Optional[str]:
+    """解析通知命令的绝对路径（每个命令只查找一次 PATH），找不到时返回 None"""
+    return shutil.which(name)
+
+
+def _combine_notifications(notifications: List[Tuple[str, str]]) -> Tuple[str, str]:
+    """将本次运行的多条 (标题, 内容) 通知合并为一条，只启动一次通知进程"""
+    if len(notifications) == 1:
+        return notifications[0]
+    return "Auto-Manager", "; ".join(message for _, message in notifications)
 
 
 def send_notification(title: str, message: str) -> None:
     """发送系统通知（跨平台）"""
-    import platform
+    system = _platform_system()
+    notifier = _NOTIFIERS.get(system)
+    if notifier is None:
+        log(f"Notifications not supported on {system}")
+        return
 
-    system = platform.system()
+    executable = _notifier_executable(notifier)
+    if executable is None:
+        log(f"Notification command not found on {system}")
+        return
 
     try:
         if system == "Darwin":  # macOS
             safe_title = escape_for_applescript(title)
             safe_message = escape_for_applescript(message)
             script = f'display notification "{safe_message}" with title "Claude Plugins" subtitle "{safe_title}"'
-            subprocess.run(
-                ["osascript", "-e", script],
-                capture_output=True,
-                timeout=10,
-                check=False,
-            )
+            cmd = ["osascript", "-e", script]
         elif system == "Linux":  # Linux
             # notify-send 自动处理特殊字符
-            subprocess.run(
-                ["notify-send", "Claude Plugins", f"{title}: {message}"],
-                capture_output=True,
-                timeout=10,
-                check=False,
-            )
-        elif system == "Windows":  # Windows
+            cmd = ["notify-send", "Claude Plugins", f"{title}: {message}"]
+        else:  # Windows
             # 使用 PowerShell 发送通知
             safe_title = escape_for_powershell(title)
             safe_message = escape_for_powershell(message)
-            ps_script = f"""
-            [Windows.UI.Notifications.ToastNotificationManager, Windows.UI.Notifications, ContentType = WindowsRuntime] | Out-Null
-            $template = [Windows.UI.Notifications.ToastNotificationManager]::GetTemplateContent([Windows.UI.Notifications.ToastTemplateType]::ToastText02)
-            $toastXml = [xml] $template.GetXml()
-            $toastXml.GetElementsByTagName("text")[0].AppendChild($toastXml.CreateTextNode("Claude Plugins")) | Out-Null
-            $toastXml.GetElementsByTagName("text")[1].AppendChild($toastXml.CreateTextNode("{safe_title}: {safe_message}")) | Out-Null
-            $xml = New-Object Windows.Data.Xml.Dom.XmlDocument
-            $xml.LoadXml($toastXml.OuterXml)
-            $toast = [Windows.UI.Notifications.ToastNotification]::new($xml)
-            [Windows.UI.Notifications.ToastNotificationManager]::CreateToastNotifier("Claude Plugins").Show($toast)
-            """
-            subprocess.run(
-                ["powershell", "-Command", ps_script],
-                capture_output=True,
-                timeout=10,
-                check=False,
-            )
-        else:
-            log(f"Notifications not supported on {system}")
-            return
-
+            ps_script = _POWERSHELL_TOAST_SCRIPT.replace("__TEXT__", f"{safe_title}: {safe_message}")
+            # -NoProfile 跳过用户 profile 加载，-NonInteractive 防止脚本等待输入
+            cmd = ["powershell", "-NoProfile", "-NonInteractive", "-Command", ps_script]
+
+        # 输出从不检查，直接丢弃，无需创建管道
+        subprocess.run(
+            cmd,
+            executable=executable,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=10,
+            check=False,
+        )
         log(f"Notification sent: {title} - {message}")
-    except FileNotFoundError:
-        log(f"Notification command not found on {system}")
     except Exception as e:
         log(f"Failed to send notification: {e}")
 
 
-def main() -> None:
-    """主函数"""
+def _seconds_since_last_run(now: datetime) -> Optional[float]:
+    """返回距上次更新的秒数；时间戳文件不存在时返回 None
+
+    update_timestamp() 会把文件 mtime 设为写入的时间，直接 stat 即可，无需读取和解析。
+    """
+    try:
+        last_run = os.stat(LAST_UPDATE_FILE).st_mtime
+    except OSError:
+        return None
+    return now.timestamp() - last_run
+
+
+def _sync_global_files(config: Dict[str, Any]) -> None:
+    """同步全局规则到 ~/.claude/CLAUDE.md，再同步全局 skills 到 ~/.claude/skills/"""
+    sync_global_rules(config)
+    sync_global_skills(config)
+
+
+def _parse_force_update() -> bool:
+    """解析命令行参数，返回是否强制更新
+
+    Hook 和系统服务都以无参数方式调用，此时无需导入 argparse 和构建解析器。
+    """
+    if len(sys.argv) <= 1:
+        return False
+
+    import argparse
+
     parser = argparse.ArgumentParser(description="Claude Code Plugin Auto Manager")
     parser.add_argument(
         "--force-update", action="store_true", help="Force update regardless of timestamp"
     )
-    args = parser.parse_args()
+    return parser.parse_args().force_update
+
+
+def main() -> None:
+    """主函数"""
+    force_update = _parse_force_update()
+
+    # 日志轮转只在启动时检查一次
+    _maybe_rotate_log()
 
     log("========================================")
     log("Claude Plugin Auto-Manager Started")
-    log("========================================")
+    log("========================================", flush=True)
+
+    # 双重运行防护：OS 服务和 Claude Code Hook 可能在同一次登录中都触发，
+    # 若 5 分钟内已运行过则跳过（--force-update 参数可绕过此检查）。
+    # 先做判断以便尽早启动 git pull，自愈步骤无论是否跳过都会执行。
+    # 本次运行只读取一次当前时间，所有时间比较和写入的时间戳都基于该值。
+    now = datetime.now(timezone.utc)
+    recent_elapsed = None if force_update else _seconds_since_last_run(now)
+    skip_run = recent_elapsed is not None and recent_elapsed < RECENT_RUN_THRESHOLD_SECONDS
+
+    # 0. 同步 auto-manager 仓库自身（拉取最新快照和配置）
+    # 在后台线程中执行，与下面不读取仓库工作区的本地自愈步骤重叠；
+    # 在加载启动服务脚本和 load_config() 之前等待完成，确保使用远程最新的脚本、配置和快照。
+    # 不受 git_sync.enabled 控制，因为 git pull 是只读操作且配置尚未加载。
+    pull_thread = None
+    if not skip_run:
+        pull_thread = threading.Thread(target=sync_self_repo, name="sync-self-repo", daemon=True)
+        pull_thread.start()
 
     # 清理 Claude Code 自动生成的备份文件
     cleanup_claude_backups()
 
     # 确保自身在 installed_plugins.json 中注册（防止被插件更新操作覆盖）
-    ensure_self_registered()
+    ensure_self_registered(now)
 
     # 确保全局 Hook 已配置（不依赖 installed_plugins.json）
     ensure_global_hook()
 
+    # git pull 可能正在改写 scripts/startup-service.py，需等待完成后再加载
+    if pull_thread is not None:
+        pull_thread.join()
+
     # 确保 OS 级启动服务已安装（自愈：检测到缺失时重新安装）
     ensure_startup_service()
 
-    # 双重运行防护：OS 服务和 Claude Code Hook 可能在同一次登录中都触发，
-    # 若 5 分钟内已运行过则跳过（--force-update 参数可绕过此检查）
-    if not args.force_update and LAST_UPDATE_FILE.exists():
-        try:
-            last_run = datetime.fromisoformat(LAST_UPDATE_FILE.read_text(encoding="utf-8").strip())
-            if last_run.tzinfo is None:
-                last_run = last_run.replace(tzinfo=timezone.utc)
-            elapsed = (datetime.now(timezone.utc) - last_run).total_seconds()
-            if elapsed < RECENT_RUN_THRESHOLD_SECONDS:
-                log(f"Skipping: last run was {elapsed:.0f}s ago (< {RECENT_RUN_THRESHOLD_SECONDS}s cooldown)")
-                log("========================================")
-                log("Claude Plugin Auto-Manager Finished")
-                log("========================================")
-                return
-        except Exception:
-            pass  # 时间戳格式异常，继续正常执行
-
-    # 0. 同步 auto-manager 仓库自身（拉取最新快照和配置）
-    # 在 load_config() 之前执行，确保使用远程最新的配置和快照。
-    # 不受 git_sync.enabled 控制，因为 git pull 是只读操作且配置尚未加载。
-    sync_self_repo()
+    if skip_run:
+        log(f"Skipping: last run was {recent_elapsed:.0f}s ago (< {RECENT_RUN_THRESHOLD_SECONDS}s cooldown)")
+        log("========================================")
+        log("Claude Plugin Auto-Manager Finished")
+        log("========================================", flush=True)
+        return
 
     # 加载配置（在 git pull 之后，确保使用最新配置）
     config = load_config()
 
+    # 2/3. 同步全局规则和 skills：只涉及 ~/.claude/CLAUDE.md 和 ~/.claude/skills/，
+    # 与插件安装互不依赖，在后台线程中与步骤 0.5 和 1 重叠执行，步骤 4 之前等待完成
+    global_sync_thread = threading.Thread(
+        target=_sync_global_files, args=(config,), name="sync-global-files", daemon=True
+    )
+    global_sync_thread.start()
+
     # 0.5. 将快照中的 marketplace 同步到本地（来自其他平台新增的 marketplace）
     sync_marketplaces_from_snapshot()
 
     # 检查安装前的插件列表变化
     plugins_changed = False
 
+    # claude CLI 不在 PATH 中时跳过所有插件操作，避免每条命令逐一失败
+    claude_available = _claude_executable() is not None
+    if not claude_available:
+        log("✗ claude CLI not found in PATH, skipping plugin install/update")
+
+    # 常用配置项只取一次
+    notify = config["auto_update"]["notify"]
+    # 本次运行的通知先收集，安装和更新完成后合并为一条发送
+    notifications: List[Tuple[str, str]] = []
+
     # 1. 安装缺失的插件
-    if config["auto_install"]["enabled"]:
-        installed_count = install_missing_plugins()
+    if not config["auto_install"]["enabled"]:
+        log("Auto-install is disabled in config")
+    elif claude_available:
+        installed_count = install_missing_plugins(now)
         # claude plugin install 可能重建 installed_plugins.json，需要重新注册
-        ensure_self_registered()
+        ensure_self_registered(now)
         if installed_count > 0:
             plugins_changed = True  # 安装了新插件，需要同步
-            if config["auto_update"]["notify"]:
-                send_notification(
-                    "Auto-Install", f"Installed {installed_count} missing plugin(s)"
-                )
-    else:
-        log("Auto-install is disabled in config")
-
-    # 2. 同步全局规则到 ~/.claude/CLAUDE.md
-    sync_global_rules(config)
+            if notify:
+                notifications.append(("Auto-Install", f"Installed {installed_count} missing plugin(s)"))
 
-    # 3. 同步全局 skills 到 ~/.claude/skills/
-    sync_global_skills(config)
+    global_sync_thread.join()
 
     # 4. 检查是否需要更新
-    if args.force_update or should_update(config):
+    if claude_available and (force_update or should_update(config, now)):
         # 先更新 marketplaces
         marketplace_updated = update_all_marketplaces()
 
         # 再更新插件
         update_count = update_all_plugins()
         # claude plugin update 可能重建 installed_plugins.json，需要重新注册
-        ensure_self_registered()
+        ensure_self_registered(now)
 
         if update_count > 0:
             # 仅在有插件实际更新时才发送通知
-            if config["auto_update"]["notify"]:
+            if notify:
                 msg = f"Updated marketplaces and {update_count} plugin(s)" if marketplace_updated > 0 else f"Updated {update_count} plugin(s)"
-                send_notification("Auto-Update", msg)
+                notifications.append(("Auto-Update", msg))
 
         # 更新时间戳
-        update_timestamp()
+        update_timestamp(now)
+
+    if notifications:
+        send_notification(*_combine_notifications(notifications))
 
     # 5. 只在插件列表变化时才创建快照并同步到 Git
     if plugins_changed or snapshot_has_changes():
@@ -1218,12 +1847,12 @@ def main() -> None:
 
     log("========================================")
     log("Claude Plugin Auto-Manager Finished")
-    log("========================================")
+    log("========================================", flush=True)
 
 
 if __name__ == "__main__":
     try:
         main()
     except Exception as e:
-        log(f"Fatal error: {e}")
+        log(f"Fatal error: {e}", flush=True)
         sys.exit(1)
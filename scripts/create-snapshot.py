@@ -34,19 +34,19 @@ def create_snapshot() -> Path:
         log("Error: installed_plugins.json not found")
         raise FileNotFoundError(f"Installed plugins file not found: {installed_file}")
 
-    settings = json.loads(settings_file.read_text())
-    installed = json.loads(installed_file.read_text())
+    settings = json.loads(settings_file.read_bytes())
+    installed = json.loads(installed_file.read_bytes())
 
     # marketplaces 文件可能不存在
     marketplaces = {}
     if marketplaces_file.exists():
-        marketplaces = json.loads(marketplaces_file.read_text())
+        marketplaces = json.loads(marketplaces_file.read_bytes())
 
     # 读取当前版本号并自增（首次创建为 "1.0"，之后 minor 版本递增）
     next_version = "1.0"
     if current_file.exists():
         try:
-            old = json.loads(current_file.read_text())
+            old = json.loads(current_file.read_bytes())
             parts = str(old.get("version", "1.0")).split(".")
             minor = int(parts[1]) if len(parts) == 2 else 0
             next_version = f"1.{minor + 1}"
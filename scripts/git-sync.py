@@ -5,14 +5,18 @@
 """
 import subprocess
 import sys
+import time
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
 
 
 # Git 仓库根目录（包含 .git 目录）
 REPO_DIR = Path.home() / ".claude" / "plugins" / "auto-manager"
 # 快照目录（仓库的子目录）
 SNAPSHOT_DIR = REPO_DIR / "snapshots"
+# 单条 Git 命令的超时时间（秒）
+GIT_COMMAND_TIMEOUT = 60
 
 
 def log(message: str) -> None:
@@ -21,11 +25,18 @@ def log(message: str) -> None:
     print(f"[{timestamp}] {message}", flush=True)
 
 
-def run_git_command(cmd: list[str], cwd: Path) -> tuple[bool, str]:
-    """执行 Git 命令，返回 (是否成功, 输出内容)"""
+def run_git_command(
+    cmd: list[str], cwd: Path, timeout: float = GIT_COMMAND_TIMEOUT
+) -> tuple[bool, str]:
+    """执行 Git 命令，返回 (是否成功, 输出内容)
+
+    timeout 不大于 0（总时间预算已用完）时不再执行，直接按超时处理。
+    """
+    if timeout <= 0:
+        return False, "Command timeout"
     try:
         result = subprocess.run(
-            cmd, cwd=cwd, capture_output=True, text=True, timeout=60, check=False
+            cmd, cwd=cwd, capture_output=True, text=True, timeout=timeout, check=False
         )
         return result.returncode == 0, result.stdout + result.stderr
     except subprocess.TimeoutExpired:
@@ -40,8 +51,25 @@ def check_git_repo() -> bool:
     return git_dir.exists() and git_dir.is_dir()
 
 
-def sync_to_git() -> bool:
-    """同步到 Git"""
+def sync_to_git(time_budget: Optional[float] = None) -> bool:
+    """同步到 Git
+
+    Args:
+        time_budget: 整个同步的总时间（秒），所有 Git 命令共享；
+            None 表示只限制单条命令（GIT_COMMAND_TIMEOUT）
+
+    Returns:
+        True 表示同步成功（或无需同步）
+    """
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+
+    def git(cmd: list[str]) -> tuple[bool, str]:
+        """在仓库目录执行 Git 命令，超时取单条命令上限与剩余预算中的较小值"""
+        timeout: float = GIT_COMMAND_TIMEOUT
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        return run_git_command(cmd, REPO_DIR, timeout)
+
     if not SNAPSHOT_DIR.exists():
         log("Snapshot directory does not exist")
         return False
@@ -52,7 +80,7 @@ def sync_to_git() -> bool:
         return False
 
     # 1. 检查是否有变更
-    success, output = run_git_command(["git", "status", "--porcelain"], REPO_DIR)
+    success, output = git(["git", "status", "--porcelain"])
     if not success:
         log(f"Failed to check Git status: {output}")
         return False
@@ -74,12 +102,12 @@ def sync_to_git() -> bool:
     existing_files = [f for f in allowed_files if (REPO_DIR / f).exists()]
 
     if existing_files:
-        success, output = run_git_command(["git", "add"] + existing_files, REPO_DIR)
+        success, output = git(["git", "add"] + existing_files)
         if not success:
             log(f"Warning: Failed to add files: {output}")
 
     # 验证是否有文件被添加到暂存区
-    success, output = run_git_command(["git", "diff", "--cached", "--name-only"], REPO_DIR)
+    success, output = git(["git", "diff", "--cached", "--name-only"])
     if not success or not output.strip():
         log("No files staged for commit")
         return True
@@ -89,16 +117,14 @@ def sync_to_git() -> bool:
     commit_msg = f"Update snapshot - {timestamp}"
     log(f"Committing: {commit_msg}")
 
-    success, output = run_git_command(
-        ["git", "commit", "-m", commit_msg], REPO_DIR
-    )
+    success, output = git(["git", "commit", "-m", commit_msg])
     if not success:
         log(f"Failed to commit: {output}")
         return False
 
     # 4. 推送到远程
     log("Pushing to remote...")
-    success, output = run_git_command(["git", "push"], REPO_DIR)
+    success, output = git(["git", "push"])
     if not success:
         # Push 失败不是致命错误，只记录日志
         log(f"Failed to push (this is not fatal): {output}")
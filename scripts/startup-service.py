@@ -78,7 +78,8 @@ def get_platform() -> str:
             try:
                 result = subprocess.run(
                     ["systemctl", "--user", "status"],
-                    capture_output=True,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
                     timeout=5,
                 )
                 # 返回码 0（active）或 3（inactive）都表示 systemd 可用
@@ -195,11 +196,13 @@ def install_launchagent(plugin_dir: Path, python_path: str) -> bool:
         # 加载到 launchd（失败不影响返回值，文件已写入下次登录自动生效）
         subprocess.run(
             ["launchctl", "unload", str(LAUNCHAGENT_PLIST_PATH)],
-            capture_output=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
         )
         subprocess.run(
             ["launchctl", "load", str(LAUNCHAGENT_PLIST_PATH)],
-            capture_output=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
         )
         return True
     except Exception as e:
@@ -213,7 +216,8 @@ def uninstall_launchagent() -> bool:
         if LAUNCHAGENT_PLIST_PATH.exists():
             subprocess.run(
                 ["launchctl", "unload", str(LAUNCHAGENT_PLIST_PATH)],
-                capture_output=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
             )
             LAUNCHAGENT_PLIST_PATH.unlink()
         return True
@@ -275,7 +279,8 @@ WantedBy=default.target
         # 首次立即运行一次
         subprocess.run(
             ["systemctl", "--user", "start", SERVICE_NAME],
-            capture_output=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
             timeout=10,
         )
         return True
@@ -289,12 +294,18 @@ def uninstall_systemd_service() -> bool:
     try:
         subprocess.run(
             ["systemctl", "--user", "disable", "--now", SERVICE_NAME],
-            capture_output=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
             timeout=10,
         )
         if SYSTEMD_SERVICE_PATH.exists():
             SYSTEMD_SERVICE_PATH.unlink()
-        subprocess.run(["systemctl", "--user", "daemon-reload"], capture_output=True, timeout=10)
+        subprocess.run(
+            ["systemctl", "--user", "daemon-reload"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=10,
+        )
         return True
     except Exception as e:
         print(f"systemd 服务卸载失败: {e}", file=sys.stderr)
@@ -65,7 +65,7 @@ def main() -> int:
     # 3. 读取插件数量
     try:
         snapshot_file = plugin_dir / "snapshots" / "current.json"
-        snapshot = json.loads(snapshot_file.read_text(encoding="utf-8"))
+        snapshot = json.loads(snapshot_file.read_bytes())
         plugin_count = len(snapshot.get("plugins", {}))
     except Exception as e:
         log_error(f"Failed to read snapshot: {e}")
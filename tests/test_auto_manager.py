@@ -4,6 +4,7 @@ Unit tests for auto-manager.py
 """
 import importlib.util
 import json
+import os
 from datetime import datetime, timezone
 from pathlib import Path
 
@@ -26,8 +27,8 @@ get_all_marketplaces = _auto_manager.get_all_marketplaces
 sync_self_repo = _auto_manager.sync_self_repo
 update_all_marketplaces = _auto_manager.update_all_marketplaces
 MAX_RETRY_COUNT = _auto_manager.MAX_RETRY_COUNT
+MAX_PARALLEL_WORKERS = _auto_manager.MAX_PARALLEL_WORKERS
 MAX_LOG_SIZE_MB = _auto_manager.MAX_LOG_SIZE_MB
-KEEP_LOG_SIZE_MB = _auto_manager.KEEP_LOG_SIZE_MB
 RETRY_INTERVAL_SECONDS = _auto_manager.RETRY_INTERVAL_SECONDS
 COMMAND_TIMEOUT_SHORT = _auto_manager.COMMAND_TIMEOUT_SHORT
 COMMAND_TIMEOUT_LONG = _auto_manager.COMMAND_TIMEOUT_LONG
@@ -65,6 +66,343 @@ class TestRetryLogic:
         assert not (5 > MAX_RETRY_COUNT)   # 第5次：仍可以重试
         assert 6 > MAX_RETRY_COUNT         # 第6次：应该被拒绝
 
+    @staticmethod
+    def _setup_failed_plugin(tmp_path, monkeypatch, plugin_state):
+        """模拟快照中有一个缺失且曾失败的插件，状态写入临时文件"""
+        state_file = tmp_path / ".last-install-state.json"
+        state_file.write_text(json.dumps({"plugins": {"feat@mp": plugin_state}}))
+        monkeypatch.setattr(_auto_manager, "LAST_INSTALL_STATE", state_file)
+        monkeypatch.setattr(_auto_manager, "get_snapshot_plugins", lambda: {"feat@mp": {}})
+        monkeypatch.setattr(_auto_manager, "get_installed_plugins", lambda: set())
+        monkeypatch.setattr(_auto_manager, "_install_check_signature", lambda: None)
+
+    def test_legacy_iso_timestamp_converted_on_load(self, tmp_path, monkeypatch):
+        """测试旧记录只有 ISO 时间时加载后补全 last_attempt_ts"""
+        last_attempt = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self._setup_failed_plugin(
+            tmp_path, monkeypatch,
+            {"status": "failed", "last_attempt": last_attempt.isoformat(), "retry_count": 1},
+        )
+
+        state = _auto_manager.load_install_state()
+        assert state["feat@mp"]["last_attempt_ts"] == last_attempt.timestamp()
+
+    def test_missing_plugins_partitioned_by_state(self, tmp_path, monkeypatch):
+        """测试缺失插件按安装状态划分：新插件和已安装后缺失的重装，超过重试次数的跳过"""
+        state_file = tmp_path / ".last-install-state.json"
+        state_file.write_text(json.dumps({"plugins": {
+            "gone@mp": {"status": "installed", "retry_count": 0},
+            "broken@mp": {"status": "failed", "last_attempt_ts": 0.0, "retry_count": MAX_RETRY_COUNT + 1},
+        }}))
+        monkeypatch.setattr(_auto_manager, "LAST_INSTALL_STATE", state_file)
+        monkeypatch.setattr(
+            _auto_manager, "get_snapshot_plugins",
+            lambda: {p: {} for p in ("new@mp", "gone@mp", "broken@mp", "ok@mp", "local")},
+        )
+        monkeypatch.setattr(_auto_manager, "get_installed_plugins", lambda: {"ok@mp"})
+        monkeypatch.setattr(_auto_manager, "_install_check_signature", lambda: None)
+
+        to_install, _ = _auto_manager.check_missing_plugins()
+        assert to_install == {"new@mp", "gone@mp"}
+
+    def test_repeated_load_parses_once_and_returns_copies(self, tmp_path, monkeypatch):
+        """测试重复加载只解析一次，且修改返回值不会污染缓存"""
+        self._setup_failed_plugin(
+            tmp_path, monkeypatch, {"status": "failed", "last_attempt_ts": 0.0, "retry_count": 1},
+        )
+        parsed = []
+        original_loads = _auto_manager.json.loads
+        monkeypatch.setattr(
+            _auto_manager.json, "loads", lambda s, *a, **k: parsed.append(s) or original_loads(s, *a, **k)
+        )
+        _auto_manager._load_json_file.cache_clear()
+
+        first = _auto_manager.load_install_state()
+        first["feat@mp"]["retry_count"] = 5
+        second = _auto_manager.load_install_state()
+
+        assert len(parsed) == 1
+        assert second["feat@mp"]["retry_count"] == 1
+
+    def test_recent_failure_not_retried(self, tmp_path, monkeypatch):
+        """测试距上次失败不足重试间隔时跳过"""
+        now_ts = datetime.now(timezone.utc).timestamp()
+        self._setup_failed_plugin(
+            tmp_path, monkeypatch,
+            {"status": "failed", "last_attempt_ts": now_ts - 60, "retry_count": 1},
+        )
+
+        to_install, _ = _auto_manager.check_missing_plugins()
+        assert to_install == set()
+
+    def test_old_failure_retried(self, tmp_path, monkeypatch):
+        """测试超过重试间隔后重新安装"""
+        now_ts = datetime.now(timezone.utc).timestamp()
+        self._setup_failed_plugin(
+            tmp_path, monkeypatch,
+            {"status": "failed", "last_attempt_ts": now_ts - RETRY_INTERVAL_SECONDS - 1, "retry_count": 1},
+        )
+
+        to_install, _ = _auto_manager.check_missing_plugins()
+        assert to_install == {"feat@mp"}
+
+    def test_skips_installed_and_local_without_loading_state(self, monkeypatch):
+        """测试已安装插件和本地插件被跳过，且无缺失时不读取安装状态"""
+        monkeypatch.setattr(
+            _auto_manager, "get_snapshot_plugins", lambda: {"a@mp": {}, "local-plugin": {}}
+        )
+        monkeypatch.setattr(_auto_manager, "get_installed_plugins", lambda: {"a@mp"})
+        monkeypatch.setattr(_auto_manager, "_install_check_signature", lambda: None)
+
+        def fail_load():
+            raise AssertionError("install state should not be loaded")
+
+        monkeypatch.setattr(_auto_manager, "load_install_state", fail_load)
+
+        to_install, _ = _auto_manager.check_missing_plugins()
+        assert to_install == set()
+
+
+class TestInstallCheckMarker:
+    """测试缺失插件检查标记（快照与 installed_plugins.json 未变化时跳过检查）"""
+
+    @staticmethod
+    def _setup(tmp_path, monkeypatch, snapshot_plugins, installed_plugins):
+        """在临时目录中创建快照、installed_plugins.json 和标记文件路径"""
+        claude_dir = tmp_path / "claude"
+        (claude_dir / "plugins").mkdir(parents=True)
+        installed_file = claude_dir / "plugins" / "installed_plugins.json"
+        installed_file.write_text(json.dumps({"plugins": {p: [] for p in installed_plugins}}))
+        snapshot = tmp_path / "current.json"
+        snapshot.write_text(json.dumps({"plugins": {p: {} for p in snapshot_plugins}}))
+
+        monkeypatch.setattr(_auto_manager, "CLAUDE_DIR", claude_dir)
+        monkeypatch.setattr(_auto_manager, "CURRENT_SNAPSHOT", snapshot)
+        monkeypatch.setattr(_auto_manager, "LAST_INSTALL_CHECK", tmp_path / ".last-install-check")
+        monkeypatch.setattr(_auto_manager, "LAST_INSTALL_STATE", tmp_path / ".last-install-state.json")
+        return snapshot, installed_file
+
+    def test_marker_written_and_used_when_nothing_missing(self, tmp_path, monkeypatch):
+        """测试无缺失时写入标记，下次检查直接跳过解析"""
+        self._setup(tmp_path, monkeypatch, ["a@mp"], ["a@mp"])
+
+        assert _auto_manager.check_missing_plugins() == (set(), {"a@mp": {}})
+        assert (tmp_path / ".last-install-check").exists()
+
+        def fail_read():
+            raise AssertionError("snapshot should not be parsed")
+
+        monkeypatch.setattr(_auto_manager, "get_snapshot_plugins", fail_read)
+        assert _auto_manager.check_missing_plugins() == (set(), {})
+
+    def test_snapshot_change_invalidates_marker(self, tmp_path, monkeypatch):
+        """测试快照变化后重新检查"""
+        snapshot, _ = self._setup(tmp_path, monkeypatch, ["a@mp"], ["a@mp"])
+        _auto_manager.check_missing_plugins()
+
+        snapshot.write_text(json.dumps({"plugins": {"a@mp": {}, "b@mp": {}}}))
+
+        to_install, _ = _auto_manager.check_missing_plugins()
+        assert to_install == {"b@mp"}
+
+    def test_no_marker_when_plugins_missing(self, tmp_path, monkeypatch):
+        """测试存在缺失插件时不写入标记"""
+        self._setup(tmp_path, monkeypatch, ["a@mp", "b@mp"], ["a@mp"])
+
+        to_install, _ = _auto_manager.check_missing_plugins()
+        assert to_install == {"b@mp"}
+        assert not (tmp_path / ".last-install-check").exists()
+
+
+class TestSnapshotHasChanges:
+    """测试快照变化检测（含键摘要缓存）"""
+
+    @staticmethod
+    def _setup(tmp_path, monkeypatch, snapshot_plugins, installed_plugins):
+        """写入快照并模拟当前已安装插件与本地 marketplace"""
+        snapshot = tmp_path / "current.json"
+        snapshot.write_text(json.dumps({"plugins": {p: {} for p in snapshot_plugins}, "marketplaces": {"mp": {}}}))
+        monkeypatch.setattr(_auto_manager, "CURRENT_SNAPSHOT", snapshot)
+        monkeypatch.setattr(_auto_manager, "SNAPSHOT_KEYS_HASH", tmp_path / ".snapshot-keys-hash")
+        monkeypatch.setattr(_auto_manager, "get_installed_plugins", lambda: set(installed_plugins))
+        monkeypatch.setattr(_auto_manager, "get_local_marketplaces", lambda: {"mp"})
+        monkeypatch.setattr(_auto_manager, "_snapshot_inputs_signature", lambda: None)
+        return snapshot
+
+    def test_unchanged_uses_cached_digest(self, tmp_path, monkeypatch):
+        """测试首次比较后缓存摘要，再次检查无需解析快照"""
+        self._setup(tmp_path, monkeypatch, ["a@mp"], ["a@mp", "auto-manager"])
+
+        assert _auto_manager.snapshot_has_changes() is False
+        assert (tmp_path / ".snapshot-keys-hash").exists()
+
+        def fail_read(path):
+            raise AssertionError("snapshot should not be parsed")
+
+        monkeypatch.setattr(_auto_manager, "_read_json_cached", fail_read)
+        assert _auto_manager.snapshot_has_changes() is False
+
+    def test_detects_new_plugin_despite_cache(self, tmp_path, monkeypatch):
+        """测试安装新插件后摘要不匹配，检测到变化"""
+        self._setup(tmp_path, monkeypatch, ["a@mp"], ["a@mp"])
+        assert _auto_manager.snapshot_has_changes() is False
+
+        monkeypatch.setattr(_auto_manager, "get_installed_plugins", lambda: {"a@mp", "b@mp"})
+        assert _auto_manager.snapshot_has_changes() is True
+
+    def test_rewritten_snapshot_invalidates_cache(self, tmp_path, monkeypatch):
+        """测试快照文件被改写后重新解析"""
+        snapshot = self._setup(tmp_path, monkeypatch, ["a@mp"], ["a@mp"])
+        assert _auto_manager.snapshot_has_changes() is False
+
+        snapshot.write_text(json.dumps({"plugins": {"a@mp": {}, "c@mp": {}}, "marketplaces": {"mp": {}}}))
+        assert _auto_manager.snapshot_has_changes() is True
+
+    def test_unchanged_inputs_skip_all_parsing(self, tmp_path, monkeypatch):
+        """测试输入文件签名与上次无变化时一致，不读取已安装插件和 marketplace"""
+        self._setup(tmp_path, monkeypatch, ["a@mp"], ["a@mp"])
+        monkeypatch.setattr(_auto_manager, "_snapshot_inputs_signature", lambda: [1, 2, 3, 4, 5, 6])
+        assert _auto_manager.snapshot_has_changes() is False
+
+        def fail(*args):
+            raise AssertionError("inputs should not be read")
+
+        monkeypatch.setattr(_auto_manager, "get_installed_plugins", fail)
+        monkeypatch.setattr(_auto_manager, "get_local_marketplaces", fail)
+        assert _auto_manager.snapshot_has_changes() is False
+
+    def test_changed_result_does_not_record_inputs(self, tmp_path, monkeypatch):
+        """测试检测到变化时不记录输入签名，下次仍会重新比较"""
+        self._setup(tmp_path, monkeypatch, ["a@mp"], ["a@mp", "b@mp"])
+        monkeypatch.setattr(_auto_manager, "_snapshot_inputs_signature", lambda: [1, 2, 3, 4, 5, 6])
+        assert _auto_manager.snapshot_has_changes() is True
+        assert _auto_manager.snapshot_has_changes() is True
+
+    def test_refresh_after_create_skips_next_check(self, tmp_path, monkeypatch):
+        """测试重建快照后刷新摘要缓存，下次检测无需解析任何文件"""
+        self._setup(tmp_path, monkeypatch, ["a@mp", "b@mp"], ["a@mp", "b@mp"])
+        monkeypatch.setattr(_auto_manager, "_snapshot_inputs_signature", lambda: [1, 2, 3, 4, 5, 6])
+
+        _auto_manager._refresh_snapshot_keys_hash()
+
+        def fail(*args):
+            raise AssertionError("inputs should not be read")
+
+        monkeypatch.setattr(_auto_manager, "get_installed_plugins", fail)
+        monkeypatch.setattr(_auto_manager, "_read_json_cached", fail)
+        assert _auto_manager.snapshot_has_changes() is False
+
+
+class TestRecentRunGuard:
+    """测试双重运行防护的时间判断"""
+
+    def test_elapsed_measured_from_written_timestamp(self, tmp_path, monkeypatch):
+        """测试经过时间基于 update_timestamp() 写入的时间（文件 mtime）"""
+        monkeypatch.setattr(_auto_manager, "LAST_UPDATE_FILE", tmp_path / ".last-update")
+        then = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+        _auto_manager.update_timestamp(then)
+
+        later = datetime(2026, 1, 2, 3, 5, 5, tzinfo=timezone.utc)
+        assert _auto_manager._seconds_since_last_run(later) == pytest.approx(60)
+        assert (tmp_path / ".last-update").read_text().strip() == then.isoformat()
+
+    def test_missing_timestamp_returns_none(self, tmp_path, monkeypatch):
+        """测试时间戳文件不存在时返回 None"""
+        monkeypatch.setattr(_auto_manager, "LAST_UPDATE_FILE", tmp_path / ".last-update")
+        assert _auto_manager._seconds_since_last_run(datetime.now(timezone.utc)) is None
+
+    def test_timestamp_written_atomically_and_fsynced(self, tmp_path, monkeypatch):
+        """测试时间戳通过临时文件原子替换并刷盘，不残留临时文件"""
+        monkeypatch.setattr(_auto_manager, "LAST_UPDATE_FILE", tmp_path / ".last-update")
+        synced = []
+        real_fsync = _auto_manager.os.fsync
+        monkeypatch.setattr(_auto_manager.os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+
+        _auto_manager.update_timestamp(datetime(2026, 1, 2, tzinfo=timezone.utc))
+
+        assert synced
+        assert [p.name for p in tmp_path.iterdir()] == [".last-update"]
+
+    def test_claude_session_checked_before_config(self, monkeypatch):
+        """测试在 Claude Code 会话中时不读取配置直接跳过更新"""
+        monkeypatch.setenv("CLAUDECODE", "1")
+        assert _auto_manager.should_update({}) is False
+
+
+class TestMainOrder:
+    """测试 main() 中 git pull 与本地自愈步骤的先后顺序"""
+
+    class _Stop(Exception):
+        """在 load_config() 处中止 main()，只验证前半段顺序"""
+
+    def _run_main(self, monkeypatch, elapsed):
+        """以 mock 步骤运行 main()，返回各步骤完成的顺序"""
+        import threading
+
+        calls = []
+        lock = threading.Lock()
+        hook_done = threading.Event()
+
+        def record(name):
+            def step(*args):
+                with lock:
+                    calls.append(name)
+                if name == "ensure_global_hook":
+                    hook_done.set()
+
+            return step
+
+        def slow_pull():
+            # pull 与自愈步骤重叠时，等到最后一个重叠步骤完成后再结束
+            hook_done.wait(timeout=5)
+            record("pull")()
+
+        def stop(*args):
+            raise self._Stop()
+
+        monkeypatch.setattr(_auto_manager, "_parse_force_update", lambda: False)
+        monkeypatch.setattr(_auto_manager, "_maybe_rotate_log", lambda: None)
+        monkeypatch.setattr(_auto_manager, "_seconds_since_last_run", lambda now: elapsed)
+        monkeypatch.setattr(_auto_manager, "sync_self_repo", slow_pull)
+        for name in ("cleanup_claude_backups", "ensure_self_registered", "ensure_global_hook", "ensure_startup_service"):
+            monkeypatch.setattr(_auto_manager, name, record(name))
+        monkeypatch.setattr(_auto_manager, "load_config", stop)
+
+        try:
+            _auto_manager.main()
+        except self._Stop:
+            pass
+        return calls
+
+    def test_startup_service_checked_after_pull(self, monkeypatch):
+        """测试启动服务脚本在 git pull 完成后才加载，其余自愈步骤与 pull 重叠"""
+        calls = self._run_main(monkeypatch, None)
+
+        assert calls.index("pull") < calls.index("ensure_startup_service")
+        assert calls.index("ensure_global_hook") < calls.index("pull")
+
+    def test_skip_run_still_checks_startup_service(self, monkeypatch):
+        """测试冷却期内跳过时不执行 pull，但仍检查启动服务"""
+        calls = self._run_main(monkeypatch, 1)
+
+        assert "pull" not in calls
+        assert calls[-1] == "ensure_startup_service"
+
+
+class TestParseForceUpdate:
+    """测试命令行参数解析"""
+
+    def test_no_arguments_skips_argparse(self, monkeypatch):
+        """测试无参数调用时直接返回 False"""
+        monkeypatch.setattr(_auto_manager.sys, "argv", ["auto-manager.py"])
+        assert _auto_manager._parse_force_update() is False
+
+    def test_force_update_flag(self, monkeypatch):
+        """测试 --force-update 参数"""
+        monkeypatch.setattr(_auto_manager.sys, "argv", ["auto-manager.py", "--force-update"])
+        assert _auto_manager._parse_force_update() is True
+
 
 class TestPluginNameValidation:
     """测试插件名称验证"""
@@ -101,24 +439,92 @@ class TestPluginNameValidation:
         assert len(parts) != 2
 
 
+class TestLogFlush:
+    """测试日志刷出策略"""
+
+    class _RecordingStdout:
+        """记录写入内容和 flush 时机的 stdout 替身"""
+
+        def __init__(self):
+            self.events = []
+
+        def write(self, text):
+            self.events.append(("write", text))
+
+        def flush(self):
+            self.events.append(("flush", None))
+
+    def test_plain_line_not_flushed(self, monkeypatch):
+        """测试普通日志行只写入缓冲区，不逐行 flush"""
+        out = self._RecordingStdout()
+        monkeypatch.setattr(_auto_manager.sys, "stdout", out)
+        _auto_manager.log("hello")
+        assert [kind for kind, _ in out.events] == ["write"]
+        assert out.events[0][1].endswith("] hello\n")
+
+    def test_critical_line_flushed_immediately(self, monkeypatch):
+        """测试 flush=True 的关键行写入后立即刷出"""
+        out = self._RecordingStdout()
+        monkeypatch.setattr(_auto_manager.sys, "stdout", out)
+        _auto_manager.log("banner", flush=True)
+        assert [kind for kind, _ in out.events] == ["write", "flush"]
+
+    def test_parallel_task_logs_flushed_per_task(self, monkeypatch):
+        """测试并发阶段每个任务的日志整体写入后立即刷出"""
+        out = self._RecordingStdout()
+        monkeypatch.setattr(_auto_manager.sys, "stdout", out)
+
+        _auto_manager._run_parallel(lambda item: _auto_manager.log(f"task {item}"), ["a", "b"])
+
+        assert [kind for kind, _ in out.events] == ["write", "flush", "write", "flush"]
+
+
 class TestLogRotation:
     """测试日志轮转"""
 
-    def test_seek_offset_when_file_larger_than_keep_size(self):
-        """测试文件大于保留大小时的 seek 偏移量"""
-        keep_size = KEEP_LOG_SIZE_MB * 1024 * 1024
-        file_size = 12 * 1024 * 1024
+    @staticmethod
+    def _setup_log(tmp_path, monkeypatch, size):
+        """创建指定大小的日志文件，并将轮转阈值设为 1MB"""
+        monkeypatch.setattr(_auto_manager, "LOG_DIR", tmp_path)
+        monkeypatch.setattr(_auto_manager, "MAX_LOG_SIZE_MB", 1)
+        log_file = tmp_path / "auto-manager.log"
+        log_file.write_bytes(b"x" * size)
+        return log_file
+
+    def test_rotates_to_backup_when_over_limit(self, tmp_path, monkeypatch):
+        """测试超过大小限制时重命名为 .log.1"""
+        log_file = self._setup_log(tmp_path, monkeypatch, 1024 * 1024 + 1)
+
+        _auto_manager._maybe_rotate_log()
+
+        assert not log_file.exists()
+        assert (tmp_path / "auto-manager.log.1").stat().st_size == 1024 * 1024 + 1
 
-        seek_offset = max(-file_size, -keep_size)
-        assert seek_offset == -keep_size
+    def test_replaces_existing_backup(self, tmp_path, monkeypatch):
+        """测试只保留一份备份"""
+        self._setup_log(tmp_path, monkeypatch, 1024 * 1024 + 1)
+        (tmp_path / "auto-manager.log.1").write_bytes(b"old")
 
-    def test_seek_offset_when_file_smaller_than_keep_size(self):
-        """测试文件小于保留大小时的 seek 偏移量（避免超出文件边界）"""
-        keep_size = KEEP_LOG_SIZE_MB * 1024 * 1024
-        file_size = 5 * 1024 * 1024
+        _auto_manager._maybe_rotate_log()
 
-        seek_offset = max(-file_size, -keep_size)
-        assert seek_offset == -file_size
+        assert (tmp_path / "auto-manager.log.1").read_bytes() != b"old"
+
+    def test_log_does_not_rotate(self, tmp_path, monkeypatch):
+        """测试 log() 本身不再检查文件大小"""
+        log_file = self._setup_log(tmp_path, monkeypatch, 1024 * 1024 + 1)
+
+        _auto_manager.log("hello")
+
+        assert log_file.exists()
+
+    def test_no_rotation_under_limit(self, tmp_path, monkeypatch):
+        """测试未超过限制时不轮转"""
+        log_file = self._setup_log(tmp_path, monkeypatch, 100)
+
+        _auto_manager._maybe_rotate_log()
+
+        assert log_file.stat().st_size == 100
+        assert not (tmp_path / "auto-manager.log.1").exists()
 
 
 class TestNotificationEscaping:
@@ -132,6 +538,10 @@ class TestNotificationEscaping:
         """测试 AppleScript 反斜杠转义"""
         assert escape_for_applescript("Path\\to\\file") == "Path\\\\to\\\\file"
 
+    def test_applescript_escapes_backslash_before_quote(self):
+        """测试反斜杠与双引号相邻时各自只转义一次"""
+        assert escape_for_applescript('a\\"b') == 'a\\\\\\"b'
+
     def test_powershell_escapes_double_quotes(self):
         """测试 PowerShell 双引号转义"""
         assert escape_for_powershell('Hello "World"') == 'Hello `"World`"'
@@ -147,6 +557,81 @@ class TestNotificationEscaping:
         assert escape_for_powershell(plain) == plain
 
 
+class TestSendNotification:
+    """测试系统通知发送"""
+
+    def test_unsupported_platform_skipped(self, monkeypatch, capsys):
+        """测试不支持的平台直接跳过"""
+        monkeypatch.setattr(_auto_manager, "_platform_system", lambda: "Plan9")
+        _auto_manager.send_notification("Title", "Message")
+        assert "not supported on Plan9" in capsys.readouterr().out
+
+    def test_missing_command_skipped_without_spawning(self, monkeypatch, capsys):
+        """测试通知命令不存在时不启动子进程"""
+        monkeypatch.setattr(_auto_manager, "_platform_system", lambda: "Linux")
+        monkeypatch.setattr(_auto_manager, "_notifier_executable", lambda name: None)
+
+        def fail_run(*args, **kwargs):
+            raise AssertionError("should not spawn a missing notifier")
+
+        monkeypatch.setattr(_auto_manager.subprocess, "run", fail_run)
+        _auto_manager.send_notification("Title", "Message")
+        assert "command not found" in capsys.readouterr().out
+
+    def test_uses_resolved_executable(self, monkeypatch):
+        """测试使用解析后的通知命令路径"""
+        monkeypatch.setattr(_auto_manager, "_platform_system", lambda: "Linux")
+        monkeypatch.setattr(_auto_manager, "_notifier_executable", lambda name: f"/usr/bin/{name}")
+        seen = []
+
+        def mock_run(cmd, **kwargs):
+            seen.append((cmd, kwargs["executable"]))
+
+        monkeypatch.setattr(_auto_manager.subprocess, "run", mock_run)
+        _auto_manager.send_notification("Title", "Message")
+        assert seen == [(["notify-send", "Claude Plugins", "Title: Message"], "/usr/bin/notify-send")]
+
+    def test_windows_skips_profile_and_escapes_text(self, monkeypatch):
+        """测试 Windows 通知跳过 profile 加载并转义消息"""
+        monkeypatch.setattr(_auto_manager, "_platform_system", lambda: "Windows")
+        monkeypatch.setattr(_auto_manager, "_notifier_executable", lambda name: "C:/ps/powershell.exe")
+        cmds = []
+        monkeypatch.setattr(_auto_manager.subprocess, "run", lambda cmd, **kwargs: cmds.append(cmd))
+
+        _auto_manager.send_notification("Title", 'Cost $5 "now"')
+
+        assert cmds[0][:4] == ["powershell", "-NoProfile", "-NonInteractive", "-Command"]
+        assert 'CreateTextNode("Title: Cost `$5 `"now`"")' in cmds[0][4]
+
+    def test_output_discarded(self, monkeypatch):
+        """测试通知命令的输出直接丢弃，不创建管道"""
+        monkeypatch.setattr(_auto_manager, "_platform_system", lambda: "Linux")
+        monkeypatch.setattr(_auto_manager, "_notifier_executable", lambda name: f"/usr/bin/{name}")
+        kwargs_seen = []
+        monkeypatch.setattr(_auto_manager.subprocess, "run", lambda cmd, **kwargs: kwargs_seen.append(kwargs))
+
+        _auto_manager.send_notification("Title", "Message")
+
+        assert kwargs_seen[0]["stdout"] is _auto_manager.subprocess.DEVNULL
+        assert kwargs_seen[0]["stderr"] is _auto_manager.subprocess.DEVNULL
+        assert "capture_output" not in kwargs_seen[0]
+
+    def test_single_notification_kept_as_is(self):
+        """测试只有一条通知时保持原标题和内容"""
+        assert _auto_manager._combine_notifications([("Auto-Install", "Installed 1 missing plugin(s)")]) == (
+            "Auto-Install", "Installed 1 missing plugin(s)"
+        )
+
+    def test_multiple_notifications_combined(self):
+        """测试安装和更新通知合并为一条"""
+        title, message = _auto_manager._combine_notifications([
+            ("Auto-Install", "Installed 2 missing plugin(s)"),
+            ("Auto-Update", "Updated 5 plugin(s)"),
+        ])
+        assert title == "Auto-Manager"
+        assert message == "Installed 2 missing plugin(s); Updated 5 plugin(s)"
+
+
 class TestSyncSelfRepo:
     """测试 auto-manager 仓库自身同步"""
 
@@ -169,6 +654,7 @@ class TestSyncSelfRepo:
             return result
 
         monkeypatch.setattr(_auto_manager.subprocess, "run", mock_run)
+        monkeypatch.setattr(_auto_manager, "_remote_head_matches_local", lambda: False)
         return captured
 
     def test_sync_success_already_up_to_date(self, monkeypatch):
@@ -193,6 +679,45 @@ class TestSyncSelfRepo:
 
         assert captured["cmd"] == ["git", "pull", "--rebase", "origin", "main"]
         assert captured["kwargs"]["cwd"] == str(_auto_manager.AUTO_MANAGER_DIR)
+        assert captured["kwargs"]["executable"] == _auto_manager._git_executable()
+
+    @staticmethod
+    def _mock_git(monkeypatch, local_sha, remote_output, remote_returncode=0):
+        """按命令返回本地 HEAD / ls-remote 结果，并记录执行过的命令"""
+        calls = []
+
+        def mock_run(cmd, **kwargs):
+            calls.append(cmd[1])
+
+            class Result:
+                pass
+
+            result = Result()
+            result.returncode = remote_returncode if cmd[1] == "ls-remote" else 0
+            result.stdout = {"rev-parse": local_sha + "\n", "ls-remote": remote_output}.get(cmd[1], "")
+            result.stderr = ""
+            return result
+
+        monkeypatch.setattr(_auto_manager.subprocess, "run", mock_run)
+        return calls
+
+    def test_matching_remote_head_skips_pull(self, monkeypatch):
+        """测试远程 main 与本地 HEAD 相同时不执行 git pull"""
+        calls = self._mock_git(monkeypatch, "abc123", "abc123\trefs/heads/main\n")
+        assert sync_self_repo() is True
+        assert calls == ["rev-parse", "ls-remote"]
+
+    def test_different_remote_head_pulls(self, monkeypatch):
+        """测试远程有新提交时执行 git pull"""
+        calls = self._mock_git(monkeypatch, "abc123", "def456\trefs/heads/main\n")
+        assert sync_self_repo() is True
+        assert calls == ["rev-parse", "ls-remote", "pull"]
+
+    def test_ls_remote_failure_falls_back_to_pull(self, monkeypatch):
+        """测试 ls-remote 失败时照常执行 git pull"""
+        calls = self._mock_git(monkeypatch, "abc123", "", remote_returncode=128)
+        sync_self_repo()
+        assert calls[-1] == "pull"
 
 
 class TestEnsureSelfRegistered:
@@ -214,6 +739,20 @@ class TestEnsureSelfRegistered:
         assert "auto-manager" in data["plugins"]
         assert data["plugins"]["auto-manager"][0]["scope"] == "user"
 
+    def test_uses_given_run_time(self, tmp_path, monkeypatch):
+        """测试注册时间戳使用调用方传入的本次运行时间"""
+        (tmp_path / "plugins").mkdir()
+        installed = tmp_path / "plugins" / "installed_plugins.json"
+        installed.write_text('{"version": 2, "plugins": {}}')
+        monkeypatch.setattr(_auto_manager, "CLAUDE_DIR", tmp_path)
+        now = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+        ensure_self_registered(now)
+
+        entry = json.loads(installed.read_text())["plugins"]["auto-manager"][0]
+        assert entry["installedAt"] == now.isoformat()
+        assert entry["lastUpdated"] == now.isoformat()
+
     def test_skips_when_already_registered(self, tmp_path, monkeypatch):
         """测试已注册时不重复注册"""
         (tmp_path / "plugins").mkdir()
@@ -364,6 +903,21 @@ class TestEnsureGlobalHook:
         assert group["hooks"][0].get("async") is True
         assert group["hooks"][1]["command"] == "echo sibling"
 
+    def test_duplicate_entries_only_first_upgraded(self, tmp_path, monkeypatch):
+        """测试同一命令出现在多个分组时只升级第一个，不追加新条目"""
+        script_path = tmp_path / "scripts" / "session-start.sh"
+        old_hook = {"type": "command", "command": str(script_path)}
+        existing = {"hooks": {"SessionStart": [{"hooks": [dict(old_hook)]}, {"hooks": [dict(old_hook)]}]}}
+        settings_local, _ = self._setup(tmp_path, monkeypatch, settings_content=json.dumps(existing))
+
+        ensure_global_hook()
+
+        groups = json.loads(settings_local.read_text())["hooks"]["SessionStart"]
+        assert len(groups) == 2
+        assert groups[0]["matcher"] == "startup"
+        assert groups[0]["hooks"][0]["async"] is True
+        assert groups[1] == {"hooks": [old_hook]}
+
     def test_preserves_existing_settings(self, tmp_path, monkeypatch):
         """测试保留已有配置"""
         existing = {
@@ -417,6 +971,119 @@ class TestGitSync:
         assert all("/" not in f or f.count("/") == 1 for f in files_to_add)
 
 
+class TestInProcessScripts:
+    """测试在本进程内调用 create-snapshot.py / git-sync.py"""
+
+    @staticmethod
+    def _write_script(tmp_path, monkeypatch, filename, body):
+        """在临时 AUTO_MANAGER_DIR/scripts 下写入辅助脚本"""
+        scripts_dir = tmp_path / "scripts"
+        scripts_dir.mkdir(exist_ok=True)
+        (scripts_dir / filename).write_text(body)
+        monkeypatch.setattr(_auto_manager, "AUTO_MANAGER_DIR", tmp_path)
+        _auto_manager._load_script.cache_clear()
+        monkeypatch.setattr(_auto_manager, "_refresh_snapshot_keys_hash", lambda: None)
+
+    def test_create_snapshot_runs_in_process(self, tmp_path, monkeypatch):
+        """测试成功创建快照且脚本只加载一次"""
+        self._write_script(
+            tmp_path, monkeypatch, "create-snapshot.py",
+            "calls = []\ndef create_snapshot():\n    calls.append(1)\n",
+        )
+
+        assert _auto_manager.create_new_snapshot() is True
+        assert _auto_manager.create_new_snapshot() is True
+        assert _auto_manager._load_script("create-snapshot.py").calls == [1, 1]
+
+    def test_create_snapshot_invalidates_cached_snapshot(self, tmp_path, monkeypatch):
+        """测试创建快照后重新读取快照，即使 mtime/大小未变"""
+        snapshot = tmp_path / "current.json"
+        snapshot.write_text('{"v": 1}')
+        monkeypatch.setattr(_auto_manager, "CURRENT_SNAPSHOT", snapshot)
+        assert _auto_manager._read_json_cached(snapshot) == {"v": 1}
+        self._write_script(
+            tmp_path, monkeypatch, "create-snapshot.py",
+            "import os\n"
+            "def create_snapshot():\n"
+            f"    path = {str(snapshot)!r}\n"
+            "    st = os.stat(path)\n"
+            "    open(path, 'w').write('{\"v\": 2}')\n"
+            "    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))\n",
+        )
+
+        assert _auto_manager.create_new_snapshot() is True
+        assert _auto_manager._read_json_cached(snapshot) == {"v": 2}
+
+    def test_create_snapshot_error_returns_false(self, tmp_path, monkeypatch):
+        """测试脚本抛出异常时返回 False 而不中断主流程"""
+        self._write_script(
+            tmp_path, monkeypatch, "create-snapshot.py",
+            "def create_snapshot():\n    raise FileNotFoundError('settings.json')\n",
+        )
+        assert _auto_manager.create_new_snapshot() is False
+
+    def test_git_sync_result_propagated(self, tmp_path, monkeypatch):
+        """测试 git-sync.py 的返回值决定同步结果"""
+        self._write_script(
+            tmp_path, monkeypatch, "git-sync.py",
+            "budgets = []\ndef sync_to_git(time_budget=None):\n    budgets.append(time_budget)\n    return False\n",
+        )
+        assert _auto_manager.sync_to_git({"git_sync": {"enabled": True}}) is False
+        assert _auto_manager._load_script("git-sync.py").budgets == [_auto_manager.COMMAND_TIMEOUT_SHORT]
+
+    @staticmethod
+    def _load_real_git_sync(tmp_path, monkeypatch):
+        """加载仓库中真实的 git-sync.py，并指向临时 Git 仓库目录"""
+        monkeypatch.setattr(_auto_manager, "AUTO_MANAGER_DIR", Path(__file__).parent.parent)
+        _auto_manager._load_script.cache_clear()
+        git_sync = _auto_manager._load_script("git-sync.py")
+        _auto_manager._load_script.cache_clear()
+        (tmp_path / ".git").mkdir()
+        (tmp_path / "snapshots").mkdir()
+        (tmp_path / "snapshots" / "current.json").write_text("{}")
+        monkeypatch.setattr(git_sync, "REPO_DIR", tmp_path)
+        monkeypatch.setattr(git_sync, "SNAPSHOT_DIR", tmp_path / "snapshots")
+        return git_sync
+
+    def test_git_sync_commands_share_time_budget(self, tmp_path, monkeypatch):
+        """测试所有 Git 命令共享总时间预算，单条命令超时不超过剩余预算"""
+        git_sync = self._load_real_git_sync(tmp_path, monkeypatch)
+        timeouts = []
+
+        def mock_run(cmd, **kwargs):
+            timeouts.append(kwargs["timeout"])
+
+            class Result:
+                returncode = 0
+                stdout = " M snapshots/current.json\n"
+                stderr = ""
+
+            return Result()
+
+        monkeypatch.setattr(git_sync.subprocess, "run", mock_run)
+        assert git_sync.sync_to_git(time_budget=30) is True
+        assert len(timeouts) == 5
+        assert all(0 < t <= 30 for t in timeouts)
+
+    def test_git_sync_exhausted_budget_runs_nothing(self, tmp_path, monkeypatch):
+        """测试总时间预算耗尽后不再启动 Git 命令"""
+        git_sync = self._load_real_git_sync(tmp_path, monkeypatch)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("git should not run")
+
+        monkeypatch.setattr(git_sync.subprocess, "run", fail)
+        assert git_sync.sync_to_git(time_budget=0) is False
+
+    def test_git_sync_disabled_skips_loading(self, monkeypatch):
+        """测试 Git 同步关闭时不加载脚本"""
+        def fail(filename):
+            raise AssertionError("script should not be loaded")
+
+        monkeypatch.setattr(_auto_manager, "_load_script", fail)
+        assert _auto_manager.sync_to_git({"git_sync": {"enabled": False}}) is False
+
+
 class TestGlobalRulesSync:
     """测试全局规则同步"""
 
@@ -467,6 +1134,19 @@ class TestGlobalRulesSync:
         _auto_manager.sync_global_rules(self.ENABLED_CONFIG)
         assert target.read_text(encoding="utf-8") == "# New Rules\n"
 
+    def test_same_size_different_content_synced(self, tmp_path, monkeypatch):
+        """测试大小相同但内容不同时仍然同步"""
+        _, target = self._setup_files(tmp_path, monkeypatch, "# Rules A\n", target_content="# Rules B\n")
+        _auto_manager.sync_global_rules(self.ENABLED_CONFIG)
+        assert target.read_text(encoding="utf-8") == "# Rules A\n"
+
+    def test_overwrite_leaves_no_temp_file(self, tmp_path, monkeypatch):
+        """测试覆盖已有目标后不残留临时文件"""
+        _, target = self._setup_files(tmp_path, monkeypatch, "# New Rules\n", target_content="# Old\n")
+        _auto_manager.sync_global_rules(self.ENABLED_CONFIG)
+        assert target.read_text(encoding="utf-8") == "# New Rules\n"
+        assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
+
     def test_creates_parent_directory(self, tmp_path, monkeypatch):
         """测试目标父目录不存在时自动创建"""
         _, target = self._setup_files(tmp_path, monkeypatch, "# Rules\n", target_path_suffix="subdir/target.md")
@@ -479,6 +1159,11 @@ class TestGlobalSkillsSync:
 
     ENABLED_CONFIG = {"global_skills_sync": {"enabled": True}}
 
+    @pytest.fixture(autouse=True)
+    def _isolate_sync_cache(self, tmp_path, monkeypatch):
+        """将签名缓存重定向到临时目录，避免写入真实环境"""
+        monkeypatch.setattr(_auto_manager, "SKILLS_SYNC_CACHE", tmp_path / ".skills-sync-cache")
+
     def test_disabled_in_config(self, capsys):
         """测试配置禁用时跳过同步"""
         _auto_manager.sync_global_skills({"global_skills_sync": {"enabled": False}})
@@ -556,6 +1241,74 @@ class TestGlobalSkillsSync:
         assert (target_dir / "skill-b" / "SKILL.md").exists()
         assert "Synced 2 skill(s)" in capsys.readouterr().out
 
+    def test_skips_directory_without_skill_file(self, tmp_path, monkeypatch, capsys):
+        """测试跳过没有 SKILL.md 的子目录"""
+        source_dir = tmp_path / "source"
+        (source_dir / "empty-skill").mkdir(parents=True)
+        target_dir = tmp_path / "target"
+
+        monkeypatch.setattr(_auto_manager, "GLOBAL_SKILLS_SOURCE_DIR", source_dir)
+        monkeypatch.setattr(_auto_manager, "GLOBAL_SKILLS_TARGET_DIR", target_dir)
+
+        _auto_manager.sync_global_skills(self.ENABLED_CONFIG)
+        assert "unchanged" in capsys.readouterr().out
+        assert not (target_dir / "empty-skill").exists()
+
+    def test_unchanged_signature_skips_reading(self, tmp_path, monkeypatch, capsys):
+        """测试文件签名与缓存一致时不再读取比较内容"""
+        source_dir = tmp_path / "source"
+        target_dir = tmp_path / "target"
+        (source_dir / "skill1").mkdir(parents=True)
+        (source_dir / "skill1" / "SKILL.md").write_text("# Skill\n", encoding="utf-8")
+
+        monkeypatch.setattr(_auto_manager, "GLOBAL_SKILLS_SOURCE_DIR", source_dir)
+        monkeypatch.setattr(_auto_manager, "GLOBAL_SKILLS_TARGET_DIR", target_dir)
+        _auto_manager.sync_global_skills(self.ENABLED_CONFIG)
+        capsys.readouterr()
+
+        def fail_compare(*args):
+            raise AssertionError("should not compare unchanged skill")
+
+        monkeypatch.setattr(_auto_manager, "_target_matches", fail_compare)
+        _auto_manager.sync_global_skills(self.ENABLED_CONFIG)
+        out = capsys.readouterr().out
+        assert "unchanged" in out
+        assert "Error" not in out
+
+    def test_modified_target_resynced(self, tmp_path, monkeypatch):
+        """测试目标文件被修改后签名失效并重新同步"""
+        source_dir = tmp_path / "source"
+        target_dir = tmp_path / "target"
+        (source_dir / "skill1").mkdir(parents=True)
+        (source_dir / "skill1" / "SKILL.md").write_text("# Skill\n", encoding="utf-8")
+
+        monkeypatch.setattr(_auto_manager, "GLOBAL_SKILLS_SOURCE_DIR", source_dir)
+        monkeypatch.setattr(_auto_manager, "GLOBAL_SKILLS_TARGET_DIR", target_dir)
+        _auto_manager.sync_global_skills(self.ENABLED_CONFIG)
+
+        target = target_dir / "skill1" / "SKILL.md"
+        target.write_text("# Edited locally\n", encoding="utf-8")
+        _auto_manager.sync_global_skills(self.ENABLED_CONFIG)
+        assert target.read_text(encoding="utf-8") == "# Skill\n"
+
+    def test_many_skills_synced_concurrently(self, tmp_path, monkeypatch, capsys):
+        """测试并发同步多个 skills 时每个都写入且计数正确"""
+        source_dir = tmp_path / "source"
+        target_dir = tmp_path / "target"
+        names = [f"skill-{i}" for i in range(MAX_PARALLEL_WORKERS * 3)]
+        for name in names:
+            (source_dir / name).mkdir(parents=True)
+            (source_dir / name / "SKILL.md").write_text(f"# {name}\n", encoding="utf-8")
+
+        monkeypatch.setattr(_auto_manager, "GLOBAL_SKILLS_SOURCE_DIR", source_dir)
+        monkeypatch.setattr(_auto_manager, "GLOBAL_SKILLS_TARGET_DIR", target_dir)
+
+        _auto_manager.sync_global_skills(self.ENABLED_CONFIG)
+
+        for name in names:
+            assert (target_dir / name / "SKILL.md").read_text(encoding="utf-8") == f"# {name}\n"
+        assert f"Synced {len(names)} skill(s)" in capsys.readouterr().out
+
     def test_skips_non_directory_entries(self, tmp_path, monkeypatch, capsys):
         """测试跳过非目录条目"""
         source_dir = tmp_path / "source"
@@ -570,6 +1323,47 @@ class TestGlobalSkillsSync:
         assert "unchanged" in capsys.readouterr().out
 
 
+class TestCleanupClaudeBackups:
+    """测试 Claude 带时间戳备份文件清理"""
+
+    def test_deletes_only_timestamped_backups(self, tmp_path, monkeypatch):
+        """测试只删除 .claude.json.backup.<timestamp>，保留主备份和其他文件"""
+        monkeypatch.setattr(_auto_manager, "CLAUDE_DIR", tmp_path)
+        for name in (".claude.json.backup.1700000000", ".claude.json.backup.1700000001",
+                     ".claude.json.backup", ".claude.json", "settings.json"):
+            (tmp_path / name).write_text("{}")
+
+        _auto_manager.cleanup_claude_backups()
+
+        remaining = sorted(p.name for p in tmp_path.iterdir())
+        assert remaining == [".claude.json", ".claude.json.backup", "settings.json"]
+
+    def test_logs_single_summary_line(self, tmp_path, monkeypatch):
+        """测试删除成功的文件只汇总记录一行日志"""
+        monkeypatch.setattr(_auto_manager, "CLAUDE_DIR", tmp_path)
+        for i in range(3):
+            (tmp_path / f".claude.json.backup.{i}").write_text("{}")
+        logs = []
+        monkeypatch.setattr(_auto_manager, "log", logs.append)
+
+        _auto_manager.cleanup_claude_backups()
+
+        assert [line for line in logs if line.startswith("✓")] == [
+            "✓ Cleaned up 3 backup file(s): .claude.json.backup.0, .claude.json.backup.1, .claude.json.backup.2"
+        ]
+        assert len(logs) == 2
+
+    def test_missing_directory_is_noop(self, tmp_path, monkeypatch):
+        """测试目录不存在时不报错"""
+        monkeypatch.setattr(_auto_manager, "CLAUDE_DIR", tmp_path / "missing")
+        logs = []
+        monkeypatch.setattr(_auto_manager, "log", logs.append)
+
+        _auto_manager.cleanup_claude_backups()
+
+        assert logs == ["No timestamped backup files to clean up"]
+
+
 class TestMarketplaceUpdate:
     """测试 Marketplace 更新逻辑"""
 
@@ -683,17 +1477,80 @@ class TestMarketplaceUpdate:
         assert "../traversal" not in result
         assert len(result) == 2
 
+    def test_get_all_marketplaces_reuses_validation(self, tmp_path, monkeypatch):
+        """测试文件未变化时不重复校验名称"""
+        mp_file = self._write_marketplaces(tmp_path, '{"official": {}, "bad name": {}}')
+        monkeypatch.setattr(_auto_manager, "KNOWN_MARKETPLACES_FILE", mp_file)
+        checked = []
+        original = _auto_manager._is_valid_marketplace_name
+
+        def counting_check(name):
+            checked.append(name)
+            return original(name)
+
+        monkeypatch.setattr(_auto_manager, "_is_valid_marketplace_name", counting_check)
+
+        assert get_all_marketplaces() == ["official"]
+        assert get_all_marketplaces() == ["official"]
+        assert len(checked) == 2
+
+    def test_invalidate_json_cache_clears_validation(self, tmp_path, monkeypatch):
+        """测试同大小改写且 mtime 不变时，显式失效后重新校验名称"""
+        mp_file = self._write_marketplaces(tmp_path, '{"aaaa": {}}')
+        monkeypatch.setattr(_auto_manager, "KNOWN_MARKETPLACES_FILE", mp_file)
+        assert get_all_marketplaces() == ["aaaa"]
+
+        st = mp_file.stat()
+        mp_file.write_text('{"bbbb": {}}')
+        os.utime(mp_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+        _auto_manager._invalidate_json_cache(mp_file)
+
+        assert get_all_marketplaces() == ["bbbb"]
+
+    @pytest.mark.parametrize("name", ["official", "a-b_c", "A1"])
+    def test_valid_marketplace_names(self, name):
+        """测试合法 marketplace 名称"""
+        assert _auto_manager._is_valid_marketplace_name(name)
+
+    @pytest.mark.parametrize("name", ["", "name\n", "市场", "a.b", "a/b"])
+    def test_invalid_marketplace_names(self, name):
+        """测试非法名称（含结尾换行、非 ASCII 字符）被拒绝"""
+        assert not _auto_manager._is_valid_marketplace_name(name)
+
+    @pytest.mark.parametrize(
+        "in_session, executable, reason",
+        [
+            (True, "/usr/bin/claude", "running inside Claude session"),
+            (False, None, "claude CLI not found"),
+        ],
+    )
+    def test_snapshot_sync_logs_skip_reason(self, tmp_path, monkeypatch, capsys, in_session, executable, reason):
+        """测试跳过 fetch 时日志给出真实原因"""
+        snapshot = tmp_path / "current.json"
+        snapshot.write_text(json.dumps({"marketplaces": {"extra": {"repo": "owner/extra"}}}))
+        mp_file = self._write_marketplaces(tmp_path, '{"official": {}}')
+        monkeypatch.setattr(_auto_manager, "CURRENT_SNAPSHOT", snapshot)
+        monkeypatch.setattr(_auto_manager, "KNOWN_MARKETPLACES_FILE", mp_file)
+        monkeypatch.setattr(_auto_manager, "is_in_claude_session", lambda: in_session)
+        monkeypatch.setattr(_auto_manager, "_claude_executable", lambda: executable)
+        calls = self._mock_subprocess_success(monkeypatch)
+
+        assert _auto_manager.sync_marketplaces_from_snapshot() == 1
+        assert f"Skipping marketplace fetch ({reason})" in capsys.readouterr().out
+        assert calls == []
+
 
 class TestPluginUpdate:
     """测试插件更新逻辑"""
 
     @staticmethod
     def _mock_installed(monkeypatch, plugins):
-        """模拟 get_installed_plugins 返回指定的插件集合"""
+        """模拟 get_installed_plugins 返回指定的插件集合，并跳过 CLI 可用性探测"""
         monkeypatch.setattr(_auto_manager, "get_installed_plugins", lambda: set(plugins))
+        monkeypatch.setattr(_auto_manager, "is_plugin_management_available", lambda: True)
 
     @staticmethod
-    def _create_mock_result(returncode=0, stdout="", stderr=""):
+    def _create_mock_result(returncode=0, stdout=b"", stderr=b""):
         """创建模拟的 subprocess 运行结果"""
         class Result:
             pass
@@ -735,7 +1592,7 @@ class TestPluginUpdate:
         def side_effect(cmd, result):
             if cmd == ["claude", "plugin", "update", "feat@marketplace"]:
                 result.returncode = 1
-                result.stderr = "Plugin not installed"
+                result.stdout = b"Plugin not installed"  # stderr 已合并到 stdout
 
         calls = self._mock_subprocess(monkeypatch, side_effect)
 
@@ -749,13 +1606,28 @@ class TestPluginUpdate:
 
         def side_effect(cmd, result):
             result.returncode = 1
-            result.stderr = "Network timeout"
+            result.stdout = b"Network timeout"
 
         calls = self._mock_subprocess(monkeypatch, side_effect)
 
         assert update_all_plugins() == 0
         assert len(calls) == 1
 
+    def test_update_merges_stderr_into_stdout(self, monkeypatch):
+        """测试插件更新合并 stderr，只需检查一份输出"""
+        self._mock_installed(monkeypatch, ["feat@marketplace"])
+        kwargs_seen = []
+
+        def mock_run(cmd, **kwargs):
+            kwargs_seen.append(kwargs)
+            return self._create_mock_result()
+
+        monkeypatch.setattr(_auto_manager.subprocess, "run", mock_run)
+
+        assert update_all_plugins() == 1
+        assert kwargs_seen[0]["stdout"] is _auto_manager.subprocess.PIPE
+        assert kwargs_seen[0]["stderr"] is _auto_manager.subprocess.STDOUT
+
     def test_empty_installed(self, monkeypatch):
         """测试没有已安装插件时返回 0"""
         self._mock_installed(monkeypatch, [])
@@ -784,20 +1656,228 @@ class TestPluginUpdate:
         def side_effect(cmd, result):
             if cmd[-1] == "b@mp":
                 result.returncode = 1
-                result.stderr = "error"
+                result.stdout = b"error"
 
         self._mock_subprocess(monkeypatch, side_effect)
 
         assert update_all_plugins() == 2
 
 
+    def test_many_plugins_each_updated_once(self, monkeypatch):
+        """测试并发更新时每个插件恰好更新一次"""
+        plugins = [f"p{i}@mp" for i in range(MAX_PARALLEL_WORKERS * 3)]
+        self._mock_installed(monkeypatch, plugins)
+        calls = self._mock_subprocess(monkeypatch)
+
+        assert update_all_plugins() == len(plugins)
+        assert sorted(cmd[-1] for cmd in calls) == sorted(plugins)
+
+    def test_management_probe_runs_once(self, monkeypatch):
+        """测试 claude plugin list 探测结果在进程内缓存"""
+        monkeypatch.setattr(_auto_manager, "get_installed_plugins", lambda: {"feat@mp"})
+        monkeypatch.setattr(_auto_manager, "_plugin_management_available", None)
+        calls = self._mock_subprocess(monkeypatch)
+
+        assert _auto_manager.is_plugin_management_available() is True
+        assert _auto_manager.is_plugin_management_available() is True
+        assert calls == [["claude", "plugin", "list"]]
+
+    def test_management_probe_detects_disabled_flag(self, monkeypatch):
+        """测试 CLI 报告无插件时判定插件管理不可用"""
+        monkeypatch.setattr(_auto_manager, "get_installed_plugins", lambda: {"feat@mp"})
+        monkeypatch.setattr(_auto_manager, "_plugin_management_available", None)
+
+        def side_effect(cmd, result):
+            result.stdout = b"No plugins installed"
+
+        self._mock_subprocess(monkeypatch, side_effect)
+
+        assert _auto_manager.is_plugin_management_available() is False
+
+    def test_management_probe_matches_case_insensitively(self, monkeypatch):
+        """测试探测在原始字节输出上不区分大小写匹配"""
+        monkeypatch.setattr(_auto_manager, "get_installed_plugins", lambda: {"feat@mp"})
+        monkeypatch.setattr(_auto_manager, "_plugin_management_available", None)
+
+        def side_effect(cmd, result):
+            result.stdout = b"Warning\nNO PLUGINS INSTALLED\n"
+
+        self._mock_subprocess(monkeypatch, side_effect)
+
+        assert _auto_manager.is_plugin_management_available() is False
+
+
+class TestLoadConfig:
+    """测试配置加载"""
+
+    def test_missing_file_returns_defaults(self, tmp_path, monkeypatch):
+        """测试配置文件不存在时返回默认配置"""
+        monkeypatch.setattr(_auto_manager, "CONFIG_FILE", tmp_path / "config.json")
+        config = _auto_manager.load_config()
+        assert config["auto_install"]["enabled"] is True
+        assert config["auto_update"]["interval_hours"] == 24
+
+    def test_unchanged_file_parsed_once(self, tmp_path, monkeypatch):
+        """测试配置文件未变化时复用解析结果"""
+        config_file = tmp_path / "config.json"
+        config_file.write_text('{"auto_install": {"enabled": false}}')
+        monkeypatch.setattr(_auto_manager, "CONFIG_FILE", config_file)
+
+        first = _auto_manager.load_config()
+        assert first["auto_install"]["enabled"] is False
+        assert _auto_manager.load_config() is first
+
+
+class TestReadJsonCached:
+    """测试 JSON 解析缓存"""
+
+    def test_reuses_parsed_result_when_unchanged(self, tmp_path):
+        """测试文件未变化时复用解析结果"""
+        f = tmp_path / "data.json"
+        f.write_text('{"a": 1}')
+        first = _auto_manager._read_json_cached(f)
+        assert _auto_manager._read_json_cached(f) is first
+
+    def test_reparses_after_file_change(self, tmp_path):
+        """测试文件内容变化后重新解析"""
+        f = tmp_path / "data.json"
+        f.write_text('{"a": 1}')
+        assert _auto_manager._read_json_cached(f) == {"a": 1}
+        f.write_text('{"a": 22}')
+        assert _auto_manager._read_json_cached(f) == {"a": 22}
+
+    def test_missing_file_raises(self, tmp_path):
+        """测试文件不存在时抛出 FileNotFoundError"""
+        with pytest.raises(FileNotFoundError):
+            _auto_manager._read_json_cached(tmp_path / "missing.json")
+
+    def test_invalidate_sees_same_size_rewrite_with_same_mtime(self, tmp_path):
+        """测试外部改写后 mtime/大小均未变时，显式失效后读到新内容"""
+        import os
+
+        f = tmp_path / "data.json"
+        f.write_text('{"a": 1}')
+        st = os.stat(f)
+        assert _auto_manager._read_json_cached(f) == {"a": 1}
+
+        f.write_text('{"a": 2}')
+        os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert _auto_manager._read_json_cached(f) == {"a": 1}
+
+        _auto_manager._invalidate_json_cache()
+        assert _auto_manager._read_json_cached(f) == {"a": 2}
+
+
+class TestAtomicWriteJson:
+    """测试原子写入 JSON"""
+
+    def test_replaces_existing_file_without_leftovers(self, tmp_path):
+        """测试覆盖已有文件且不残留临时文件"""
+        f = tmp_path / "data.json"
+        f.write_text('{"old": true}')
+
+        _auto_manager._atomic_write_json(f, {"名称": "值"}, indent=4)
+
+        assert json.loads(f.read_text(encoding="utf-8")) == {"名称": "值"}
+        assert f.read_text(encoding="utf-8").endswith("\n")
+        assert [p.name for p in tmp_path.iterdir()] == ["data.json"]
+
+    def test_invalidates_json_cache(self, tmp_path):
+        """测试写入后缓存读取返回新内容"""
+        f = tmp_path / "data.json"
+        f.write_text('{"a": 1}')
+        assert _auto_manager._read_json_cached(f) == {"a": 1}
+
+        _auto_manager._atomic_write_json(f, {"a": 2})
+
+        assert _auto_manager._read_json_cached(f) == {"a": 2}
+
+    def test_failed_replace_removes_temp_file(self, tmp_path, monkeypatch):
+        """测试替换失败时删除临时文件并保留原文件"""
+        f = tmp_path / "data.json"
+        f.write_text('{"a": 1}')
+
+        def fail_replace(src, dst):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(_auto_manager.os, "replace", fail_replace)
+        with pytest.raises(OSError):
+            _auto_manager._atomic_write_json(f, {"a": 2})
+
+        assert [p.name for p in tmp_path.iterdir()] == ["data.json"]
+        assert json.loads(f.read_text()) == {"a": 1}
+
+    def test_prime_cache_skips_reparse(self, tmp_path, monkeypatch):
+        """测试 prime_cache=True 时写入后读取直接返回写入的数据"""
+        f = tmp_path / "data.json"
+        data = {"a": 3}
+        _auto_manager._atomic_write_json(f, data, prime_cache=True)
+
+        def fail_parse(*args):
+            raise AssertionError("should not re-parse primed file")
+
+        monkeypatch.setattr(_auto_manager, "_load_json_file", fail_parse)
+        assert _auto_manager._read_json_cached(f) is data
+
+    def test_primed_entry_ignored_after_external_change(self, tmp_path):
+        """测试文件被外部修改后不再返回预填充的数据"""
+        f = tmp_path / "data.json"
+        _auto_manager._atomic_write_json(f, {"a": 3}, prime_cache=True)
+        f.write_text('{"a": 333}')
+        assert _auto_manager._read_json_cached(f) == {"a": 333}
+
+    def test_install_state_is_fsynced_with_directory(self, tmp_path, monkeypatch):
+        """测试安装状态写入时刷写文件和所在目录"""
+        monkeypatch.setattr(_auto_manager, "LAST_INSTALL_STATE", tmp_path / ".last-install-state.json")
+        synced = []
+        real_fsync = _auto_manager.os.fsync
+        monkeypatch.setattr(_auto_manager.os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+
+        _auto_manager.save_install_state({"a@mp": {"status": "installed"}})
+
+        expected = 2 if hasattr(_auto_manager.os, "O_DIRECTORY") else 1
+        assert len(synced) == expected
+        assert json.loads((tmp_path / ".last-install-state.json").read_text())["plugins"] == {
+            "a@mp": {"status": "installed"}
+        }
+
+
+class TestRunParallel:
+    """测试并发执行辅助函数"""
+
+    def test_preserves_input_order(self):
+        """测试结果顺序与输入顺序一致"""
+        items = [str(i) for i in range(10)]
+        assert _auto_manager._run_parallel(lambda x: int(x) % 2 == 0, items) == [
+            int(x) % 2 == 0 for x in items
+        ]
+
+    def test_empty_items(self):
+        """测试空列表直接返回"""
+        assert _auto_manager._run_parallel(lambda x: True, []) == []
+
+    def test_task_logs_grouped_in_input_order(self, capsys):
+        """测试各任务的日志按输入顺序整体输出，不交错"""
+        import time
+
+        def task(item):
+            _auto_manager.log(f"start {item}")
+            time.sleep(0.05 if item == "a" else 0)
+            _auto_manager.log(f"end {item}")
+            return True
+
+        _auto_manager._run_parallel(task, ["a", "b", "c"])
+
+        messages = [line.split("] ", 1)[1] for line in capsys.readouterr().out.splitlines()]
+        assert messages == ["start a", "end a", "start b", "end b", "start c", "end c"]
+
+
 def test_constants_have_expected_values():
     """测试常量已正确定义且值合理"""
     assert MAX_LOG_SIZE_MB == 10
-    assert KEEP_LOG_SIZE_MB == 8
-    assert KEEP_LOG_SIZE_MB < MAX_LOG_SIZE_MB
     assert RETRY_INTERVAL_SECONDS == 600
     assert MAX_RETRY_COUNT == 5
+    assert MAX_PARALLEL_WORKERS == 4
     assert COMMAND_TIMEOUT_SHORT == 60
     assert COMMAND_TIMEOUT_LONG == 120
     assert COMMAND_TIMEOUT_SHORT < COMMAND_TIMEOUT_LONG
@@ -130,6 +130,19 @@ class TestPlatformDetection:
                     mock_run.return_value = MagicMock(returncode=3)
                     assert get_platform() == "linux_systemd"
 
+    def test_systemctl_status_output_discarded(self, monkeypatch):
+        """systemctl status 只看返回码，输出直接丢弃不捕获"""
+        monkeypatch.setattr(_startup_service, "is_devcontainer", lambda: False)
+        with patch("platform.system", return_value="Linux"):
+            with patch("shutil.which", return_value="/usr/bin/systemctl"):
+                with patch("subprocess.run") as mock_run:
+                    mock_run.return_value = MagicMock(returncode=0)
+                    get_platform()
+        kwargs = mock_run.call_args.kwargs
+        assert kwargs["stdout"] is subprocess.DEVNULL
+        assert kwargs["stderr"] is subprocess.DEVNULL
+        assert "capture_output" not in kwargs
+
     def test_linux_cron_when_no_systemctl(self, monkeypatch):
         """Linux + systemctl 不可用时返回 linux_cron"""
         monkeypatch.setattr(_startup_service, "is_devcontainer", lambda: False)
@@ -314,7 +327,7 @@ class TestInstallLaunchAgent:
             result = install_launchagent(tmp_path, sys.executable)
 
         # plist 文件写入是在 launchctl 之前完成的，但 CalledProcessError 会中断整个函数
-        # 实际实现中 launchctl 用 capture_output=True 不会 raise，这里模拟异常
+        # 实际实现中 launchctl 未设置 check=True，不会 raise，这里模拟异常
         # 预期：文件写入后才调用 launchctl，所以这个测试验证异常处理
         assert result is False  # 发生异常时返回 False（由外层 except 捕获）
 